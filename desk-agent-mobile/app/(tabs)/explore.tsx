@@ -7,6 +7,10 @@ import { useEffect, useRef, useState } from "react";
 import { StatusCard } from "@/components/status-card";
 import { UsageChart } from "@/components/usage-chart";
 
+// Controle de fluxo: a API envia no máximo ACK_WINDOW mensagens sem confirmação
+const ACK_WINDOW = 64;
+const ACK_EVERY = 16;
+
 export default function PCInfo() {
 
   const MAX_POINTS = 60;
@@ -42,13 +46,29 @@ export default function PCInfo() {
         JSON.stringify({
           type: "hello",
           role: "app",
+          ack_window: ACK_WINDOW,
         }),
       );
     };
 
+    let received = 0;
     ws.onmessage = (e) => {
+      received += 1;
+      if (received % ACK_EVERY === 0) {
+        ws.send(JSON.stringify({ type: "ack", received }));
+      }
+
       try {
-        const data = JSON.parse(e.data);
+        let data = JSON.parse(e.data);
+
+        // Replay do último estado logo após o hello: usa o último pc_info conhecido
+        if (data.type === "state_replay") {
+          const snapshot = Object.values(data.agents ?? {})
+            .map((agent: any) => agent.snapshot)
+            .find(Boolean);
+          if (!snapshot) return;
+          data = snapshot;
+        }
 
         if (data.type === "pc_info") {
           lastPingRef.current = Date.now(); // ← Atualiza a ref
@@ -21,6 +21,10 @@ const WS_URL =
 
 type ToastType = "success" | "error" | "info";
 
+// Controle de fluxo: a API envia no máximo ACK_WINDOW mensagens sem confirmação
+const ACK_WINDOW = 64;
+const ACK_EVERY = 16;
+
 export default function HomeScreen() {
   const [status, setStatus] = useState<"online" | "offline">("offline");
   const [toastMessage, setToastMessage] = useState("");
@@ -188,11 +192,18 @@ export default function HomeScreen() {
         JSON.stringify({
           type: "hello",
           role: "app",
+          ack_window: ACK_WINDOW,
         }),
       );
     };
 
+    let received = 0;
     ws.onmessage = (e) => {
+      received += 1;
+      if (received % ACK_EVERY === 0) {
+        ws.send(JSON.stringify({ type: "ack", received }));
+      }
+
       try {
         const data = JSON.parse(e.data);
 
@@ -202,6 +213,15 @@ export default function HomeScreen() {
           setStatus("online");
         }
 
+        if (data.type === "state_replay") {
+          const online = Object.values(data.agents ?? {}).some((agent: any) => agent.online);
+          if (online) {
+            lastPingRef.current = Date.now();
+            setLastPing(Date.now());
+            setStatus("online");
+          }
+        }
+
         if (data.type === "feedback") {
           setToastMessage(data.message);
           setToastType(data.status);
@@ -223,6 +243,14 @@ export default function HomeScreen() {
             return newLogs.slice(0, 50); // Manter apenas 50 logs mais recentes
           });
         }
+
+        if (data.type === "log_batch") {
+          // Lote vem em ordem cronológica; a lista mostra o mais recente primeiro
+          setLogs((prevLogs) => {
+            const newLogs = [...[...data.logs].reverse(), ...prevLogs];
+            return newLogs.slice(0, 50);
+          });
+        }
       } catch (error) {
         console.error("Erro ao processar mensagem:", error);
       }
@@ -0,0 +1,180 @@
+import asyncio
+import shlex
+import time
+
+import psutil
+
+
+class ActionError(Exception):
+    """Falha esperada de uma ação; a mensagem vai para o app no feedback."""
+
+    def __init__(self, message, exit_code=None):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+class ActionRegistry:
+    """Ações que o agent aceita, por nome.
+
+    Cada ação é um handler que recebe o comando e devolve um dict com os
+    campos extras do feedback (message, exit_code, latency_ms...). Os
+    handlers rodam dentro do processo: funções async no event loop e
+    funções comuns numa thread do executor, para não travar o recv.
+
+    Só as ações privilegiadas (desligar, reiniciar...) continuam indo ao
+    shell, com `shell()`, porque precisam de sudo.
+    """
+
+    def __init__(self):
+        self._actions = {}
+
+    def __contains__(self, name):
+        return name in self._actions
+
+    def names(self):
+        return list(self._actions)
+
+    def register(self, name, handler):
+        if asyncio.iscoroutinefunction(handler):
+            self._actions[name] = lambda data: lambda: handler(data)
+        else:
+            self._actions[name] = lambda data: lambda: _in_thread(handler, data)
+
+    def action(self, name):
+        """Decorator: registra a função como handler de `name`."""
+        def decorator(handler):
+            self.register(name, handler)
+            return handler
+        return decorator
+
+    def shell(self, name, command):
+        """Ação que roda um processo; `command` é a linha ou build(data) -> argv."""
+        if callable(command):
+            build = command
+        else:
+            argv = shlex.split(command)
+            build = lambda data: argv  # noqa: E731
+
+        def bind(data):
+            argv = build(data)
+            return lambda: run_argv(argv)
+        self._actions[name] = bind
+
+    def prepare(self, name, data):
+        """Valida o comando e devolve a execução, sem rodar ainda.
+
+        Erros de validação (ActionError) saem aqui, antes da fila.
+        """
+        bind = self._actions.get(name)
+        if bind is None:
+            raise ActionError("Comando não permitido")
+        return bind(data)
+
+
+async def _in_thread(handler, data):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, handler, data)
+
+
+async def run_argv(argv):
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as e:
+        raise ActionError(f"Falha ao iniciar: {e}")
+
+    try:
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Timeout do executor: o processo não pode ficar órfão
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if proc.returncode != 0:
+        detail = stderr.decode(errors="replace").strip()[:200]
+        raise ActionError(f"Saiu com código {proc.returncode} {detail}".strip(), proc.returncode)
+    return {"exit_code": 0}
+
+
+def kill_by_name(name, grace=3):
+    """Encerra os processos cujo nome contém `name` (como o pkill).
+
+    Manda SIGTERM, espera até `grace` segundos e mata quem sobrou.
+    """
+    victims = []
+    denied = 0
+    for proc in psutil.process_iter(["name"]):
+        if name not in (proc.info["name"] or ""):
+            continue
+        try:
+            proc.terminate()
+            victims.append(proc)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied:
+            denied += 1
+
+    if not victims:
+        if denied:
+            raise ActionError(f"Sem permissão para encerrar '{name}'")
+        raise ActionError(f"Nenhum processo '{name}' encontrado", 1)
+
+    _, alive = psutil.wait_procs(victims, timeout=grace)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+    return {
+        "message": f"{len(victims)} processo(s) '{name}' encerrado(s)",
+        "killed": len(victims),
+        "forced": len(alive),
+        "denied": denied
+    }
+
+
+async def ping(data, targets=None, attempts=3, timeout=2):
+    """Echo do agent; com `host`, mede a latência de conexão TCP até ele.
+
+    Sem host, devolve o `timestamp` do comando e a hora do agent para o
+    app calcular o tempo de ida e volta. TCP em vez de ICMP porque não
+    precisa de root. Só aceita hosts de `targets` ({host: porta}, o
+    PING_TARGETS de configs), na porta configurada.
+    """
+    result = {
+        "message": "pong",
+        "echo": data.get("timestamp"),
+        "agent_time": time.time()
+    }
+
+    host = data.get("host")
+    if not host:
+        return result
+
+    port = (targets or {}).get(host)
+    if port is None:
+        raise ActionError(f"Host '{host}' não permitido para ping")
+
+    samples = []
+    for _ in range(attempts):
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ActionError(f"{host}:{port} inacessível: {e or 'timeout'}")
+        samples.append((time.perf_counter() - started) * 1000)
+        writer.close()
+        await writer.wait_closed()
+
+    latency = min(samples)
+    result.update({
+        "message": f"pong de {host}:{port} em {latency:.1f} ms",
+        "latency_ms": round(latency, 2),
+        "samples_ms": [round(sample, 2) for sample in samples]
+    })
+    return result
@@ -1,16 +1,22 @@
 import asyncio
 import json
-import websockets
 import subprocess
 import os
 from dotenv import load_dotenv
+from connection import Backoff, ConnectionManager
 import time
 import signal
+import socket
 import sys
+import logging
+from logsetup import setup_logging
 
 load_dotenv()
 TOKEN = os.getenv("AGENT_TOKEN")
 URL = os.getenv("PUBLIC_WS_URL")
+AGENT_ID = os.getenv("AGENT_ID") or socket.gethostname()
+
+logger = logging.getLogger("agent")
 
 ALLOWED = {
   "shutdown": "sudo /sbin/shutdown now",
@@ -24,7 +30,7 @@ ALLOWED = {
 }
 
 def shutdown(sig, frame):
-    print("Encerrando agent...")
+    logger.info("Encerrando agent")
     sys.exit(0)
 
 async def send_log(ws, level, message):
@@ -77,47 +83,49 @@ async def heartbeat(websocket):
 
         await asyncio.sleep(5)
 
-async def listen():
-    uri = URL
-
-    while True:
-        try:
-            async with websockets.connect(uri) as websocket:
-                await send_log(websocket, "info", "Agent conectado")
+async def say_hello(websocket):
+    await websocket.send(json.dumps({
+        "type": "hello",
+        "role": "agent",
+        "token": TOKEN,
+        "agent_id": AGENT_ID
+    }))
+    await send_log(websocket, "info", "Agent conectado")
 
-                await websocket.send(json.dumps({
-                    "type": "hello",
-                    "role": "agent",
-                    "token": TOKEN
-                }))
 
-                asyncio.create_task(heartbeat(websocket))
+async def on_message(websocket, message):
+    data = json.loads(message)
 
-                while True:
-                    message = await websocket.recv()
-                    data = json.loads(message)
+    if data.get("type") != "command":
+        return
 
-                    if data.get("type") != "command":
-                        continue
+    feedback = execute(data.get("action"), data)
 
-                    feedback = execute(data.get("action"), data)
+    await send_log(
+        websocket,
+        "success" if feedback["status"] == "success" else "error",
+        feedback["message"]
+    )
 
-                    await send_log(
-                        websocket,
-                        "success" if feedback["status"] == "success" else "error",
-                        feedback["message"]
-                    )
+    await websocket.send(json.dumps({
+        "type": "feedback",
+        "role": "agent",
+        "request_id": data.get("request_id"),
+        **feedback
+    }))
 
-                    await websocket.send(json.dumps({
-                        "type": "feedback",
-                        "role": "agent",
-                        **feedback
-                    }))
 
-        except Exception as e:
-            print("❌ API indisponível, tentando novamente em 3s...")
-            await asyncio.sleep(3)
+async def listen():
+    connection = ConnectionManager(
+        URL,
+        on_connect=say_hello,
+        on_message=on_message,
+        tasks=[heartbeat],
+        backoff=Backoff()
+    )
+    await connection.run()
 
 
+setup_logging()
 asyncio.run(listen())
 signal.signal(signal.SIGTERM, shutdown)
\ No newline at end of file
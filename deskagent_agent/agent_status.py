@@ -1,68 +1,138 @@
+# Legado: o agent_v2.py já envia a telemetria pela própria conexão de
+# controle. Este script só é necessário junto com o agent.py antigo.
 import asyncio
-import json
-import websockets
-import subprocess
 import os
 from dotenv import load_dotenv
 import time
-import signal
-import sys
-import psutil
-import socket
-import getpass
+import logging
+from collector import MetricsCollector
+from configs import (
+    AGENT_ID, METRICS_SCHEDULE, MIN_SAMPLE_INTERVAL, PROCESS_INTERVAL,
+    PROCESS_TOP_N, RECONNECT_BASE, RECONNECT_CAP, SAMPLE_INTERVAL,
+    TELEMETRY_KEYFRAME_EVERY, TOKEN, WIRE_PROTOCOL
+)
+from connection import Backoff, ConnectionManager
+from logsetup import setup_logging
+from processes import ProcessEncoder, ProcessSampler
+from telemetry import TelemetryEncoder
+from wire import Wire
 
 load_dotenv()
 URL = os.getenv("PUBLIC_WS_URL_STATUS")
 
+logger = logging.getLogger("agent_status")
+
+
+wire = Wire(WIRE_PROTOCOL)
+
 
-def get_local_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))  # não envia nada de verdade
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1"
-    
 async def heartbeat(websocket):
     while True:
-        await websocket.send(json.dumps({
+        await wire.send(websocket, {
             "type": "heartbeat",
             "role": "agent",
-        }))
+        })
 
         await asyncio.sleep(3)
 
-def collect_system_info():
-    return {
-        "type": "pc_info",
-        "cpu_percent": psutil.cpu_percent(interval=1),
-        "memory": psutil.virtual_memory().used,
-        "memory_total": psutil.virtual_memory().total,
-        "disk_usage": psutil.disk_usage('/').used,
-        "disk_total": psutil.disk_usage('/').total,
-        "uptime": time.time() - psutil.boot_time(),
-        "timestamp": time.time(),
-        "system": os.uname().sysname,
-        "node_name": os.uname().nodename,
-        "user": getpass.getuser(),
-        "ip_local": get_local_ip(),
-    }
-
-async def send_system_info():
-    async with websockets.connect(URL) as ws:
-        await ws.send(json.dumps({
-            "type": "hello",
-            "role": "agent",
-        }))
 
-        asyncio.create_task(heartbeat(ws))
+collector = MetricsCollector(METRICS_SCHEDULE)
+encoder = TelemetryEncoder(TELEMETRY_KEYFRAME_EVERY)
+processes = ProcessSampler(PROCESS_TOP_N)
+process_encoder = ProcessEncoder(TELEMETRY_KEYFRAME_EVERY)
+
+# Ajustado pela API (rate_control); None = só heartbeat
+rate = {"interval": SAMPLE_INTERVAL}
+rate_changed = asyncio.Event()
+
+
+def set_rate(interval):
+    if interval is not None:
+        interval = max(float(interval), MIN_SAMPLE_INTERVAL)
+        collector.set_interval(interval)
+    if interval != rate["interval"]:
+        rate["interval"] = interval
+        rate_changed.set()
+
+
+async def say_hello(ws):
+    # Nova sessão: o servidor precisa de descriptor e keyframe de novo
+    encoder.reset()
+    process_encoder.reset()
+    wire.reset()
+    set_rate(SAMPLE_INTERVAL)
+    await wire.send(ws, {
+        "type": "hello",
+        "role": "agent",
+        "token": TOKEN,
+        "agent_id": AGENT_ID,
+        **wire.hello_fields(),
+    })
+
+
+async def on_message(ws, message):
+    data = wire.decode(message)
+    if wire.accept(data):
+        return
+
+    if data.get("type") == "rate_control":
+        try:
+            set_rate(data.get("interval"))
+        except (TypeError, ValueError):
+            logger.warning("rate_control inválido: %s", data)
+
+
+async def send_system_info(ws):
+    loop = asyncio.get_running_loop()
+    next_sample = loop.time()
+
+    while True:
+        rate_changed.clear()
+        timeout = None
+        if rate["interval"] is not None:
+            info = await collector.collect()
+            logger.debug("Enviando info do sistema", extra={
+                "cpu_percent": info.get("cpu_percent"),
+                "memory": info.get("memory"),
+            })
+            for message in encoder.encode(info):
+                await wire.send(ws, message)
+
+            # Cadência fixa: o tempo de coleta não atrasa a próxima amostra
+            next_sample += rate["interval"]
+            timeout = max(0, next_sample - loop.time())
+
+        try:
+            await asyncio.wait_for(rate_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            continue
+        next_sample = loop.time()
+
+
+async def send_processes(ws):
+    loop = asyncio.get_running_loop()
+    # Primeira passada só guarda os tempos de CPU de referência
+    await loop.run_in_executor(None, processes.sample)
+
+    while True:
+        await asyncio.sleep(PROCESS_INTERVAL)
+        if rate["interval"] is None:
+            continue  # ninguém olhando (rate_control idle)
+        rows = await loop.run_in_executor(None, processes.sample)
+        await wire.send(ws, process_encoder.encode(rows, time.time()))
+
+
+tasks = [heartbeat, send_system_info]
+if PROCESS_TOP_N > 0:
+    tasks.append(send_processes)
 
-        while True:
-            info = collect_system_info()
-            print("Enviando info do sistema:", info)
-            await ws.send(json.dumps(info))
-            await asyncio.sleep(3)
+connection = ConnectionManager(
+    URL,
+    on_connect=say_hello,
+    on_message=on_message,
+    tasks=tasks,
+    backoff=Backoff(RECONNECT_BASE, RECONNECT_CAP)
+)
 
-asyncio.run(send_system_info())
\ No newline at end of file
+setup_logging()
+asyncio.run(connection.run())
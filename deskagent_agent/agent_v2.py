@@ -1,102 +1,234 @@
-from configs import ALLOWED, TOKEN, URL
+from actions import ActionError, ActionRegistry, kill_by_name, ping
+from collector import MetricsCollector
+from configs import (
+    AGENT_ID, AGENT_TAGS, ALLOWED, COMMAND_TIMEOUT, HEARTBEAT_MODE,
+    KILL_TARGETS, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_QUEUE_SIZE,
+    MAX_CONCURRENT_COMMANDS, METRICS_SCHEDULE, MIN_SAMPLE_INTERVAL, PING_TARGETS,
+    PROCESS_INTERVAL, PROCESS_TOP_N, RECONNECT_BASE, RECONNECT_CAP, SAMPLE_INTERVAL, TELEMETRY_KEYFRAME_EVERY,
+    TOKEN, URL, WIRE_PROTOCOL
+)
+from connection import Backoff, ConnectionManager
+from executor import CommandExecutor
+from logbuffer import LogBuffer
+from logsetup import setup_logging
+from processes import ProcessEncoder, ProcessSampler
+from telemetry import TelemetryEncoder
+from wire import Wire
 import asyncio
-import json
-import websockets
-import subprocess
-import time
+import logging
 import signal
-import sys
+import time
+from functools import partial
+
+
+logger = logging.getLogger("agent")
 
 
 class Agent:
+    """Agent com uma conexão só: comandos, feedback, logs e telemetria."""
+
     def __init__(self):
         self.running = True
-
-    def shutdown(self, sig, frame):
-        print("🛑 Encerrando agent...")
+        self.wire = Wire(WIRE_PROTOCOL)
+        self.executor = CommandExecutor(
+            self.report,
+            max_concurrent=MAX_CONCURRENT_COMMANDS,
+            timeout=COMMAND_TIMEOUT
+        )
+        self.logs = LogBuffer(
+            max_batch=LOG_BATCH_SIZE,
+            flush_interval=LOG_FLUSH_INTERVAL,
+            max_queue=LOG_QUEUE_SIZE,
+            encode=self.wire.encode
+        )
+        self.actions = build_actions()
+        self.collector = MetricsCollector(METRICS_SCHEDULE)
+        self.encoder = TelemetryEncoder(TELEMETRY_KEYFRAME_EVERY)
+        self.processes = ProcessSampler(PROCESS_TOP_N)
+        self.process_encoder = ProcessEncoder(TELEMETRY_KEYFRAME_EVERY)
+        # Ajustado pela API (rate_control); None = só heartbeat
+        self.sample_interval = SAMPLE_INTERVAL
+        self.rate_changed = asyncio.Event()
+        tasks = [self.logs.run, self.send_system_info]
+        if HEARTBEAT_MODE != "ping":
+            tasks.append(self.heartbeat)
+        if PROCESS_TOP_N > 0:
+            tasks.append(self.send_processes)
+        self.connection = ConnectionManager(
+            URL,
+            on_connect=self.on_connect,
+            on_message=self.on_message,
+            tasks=tasks,
+            backoff=Backoff(RECONNECT_BASE, RECONNECT_CAP)
+        )
+
+    @property
+    def ws(self):
+        return self.connection.ws
+
+    def shutdown(self):
+        logger.info("Encerrando agent")
         self.running = False
-
-    async def send_log(self, ws, level, message):
-        await ws.send(json.dumps({
-            "type": "log",
-            "level": level,
-            "source": "agent",
-            "message": message,
-            "timestamp": time.time()
-        }))
-
-    def run(self, cmd):
-        subprocess.Popen(cmd, shell=True)
-
-    def execute(self, action, data):
-        if action not in ALLOWED and action != "shutdown_with_time":
-            return {"status": "error", "message": "Comando não permitido"}
-
-        if action == "shutdown_with_time":
-            minutes = data.get("minutes")
-            if not isinstance(minutes, int) or minutes <= 0:
-                return {"status": "error", "message": "Minutos inválidos"}
-
-            self.run(f"sudo /sbin/shutdown +{minutes}")
-            return {
-                "status": "success",
-                "message": f"Desligamento agendado para {minutes} minutos"
-            }
-
-        self.run(ALLOWED[action])
-        return {"status": "success", "message": f"Comando '{action}' executado"}
+        asyncio.create_task(self.connection.stop())
+
+    def send_log(self, level, message):
+        # Não bloqueia: a linha entra no buffer e sai no próximo log_batch
+        self.logs.add(level, message)
+
+    async def report(self, feedback):
+        if self.ws is None:
+            raise ConnectionError("sem conexão com a API")
+
+        if feedback.get("phase") == "finished":
+            self.send_log(
+                "success" if feedback["status"] == "success" else "error",
+                feedback["message"]
+            )
+
+        await self.wire.send(self.ws, {
+            "type": "feedback",
+            "role": "agent",
+            **feedback
+        })
+
+    async def execute(self, data):
+        action = data.get("action")
+        context = {
+            "request_id": data.get("request_id"),
+            "reply_to": data.get("reply_to"),
+            "action": action,
+        }
+
+        try:
+            run = self.actions.prepare(action, data)
+        except ActionError as e:
+            await self.report({
+                **context,
+                "status": "error",
+                "phase": "finished",
+                "message": str(e)
+            })
+            return
+
+        await self.executor.submit(context, run)
 
     async def heartbeat(self, ws):
-        while self.running:
-            await ws.send(json.dumps({
+        while True:
+            await self.wire.send(ws, {
                 "type": "heartbeat",
                 "role": "agent",
                 "token": TOKEN
-            }))
+            })
             await asyncio.sleep(5)
 
-    async def listen(self):
-        while self.running:
+    def set_rate(self, interval):
+        if interval is not None:
+            interval = max(float(interval), MIN_SAMPLE_INTERVAL)
+            self.collector.set_interval(interval)
+        if interval != self.sample_interval:
+            self.sample_interval = interval
+            self.rate_changed.set()
+
+    async def send_system_info(self, ws):
+        loop = asyncio.get_running_loop()
+        next_sample = loop.time()
+
+        while True:
+            self.rate_changed.clear()
+            timeout = None
+            if self.sample_interval is not None:
+                info = await self.collector.collect()
+                for message in self.encoder.encode(info):
+                    await self.wire.send(ws, message)
+
+                # Cadência fixa: o tempo de coleta não atrasa a próxima amostra
+                next_sample += self.sample_interval
+                timeout = max(0, next_sample - loop.time())
+
+            try:
+                await asyncio.wait_for(self.rate_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            # Taxa mudou: amostra já e recomeça a cadência
+            next_sample = loop.time()
+
+    async def send_processes(self, ws):
+        loop = asyncio.get_running_loop()
+        # Primeira passada só guarda os tempos de CPU de referência
+        await loop.run_in_executor(None, self.processes.sample)
+
+        while True:
+            await asyncio.sleep(PROCESS_INTERVAL)
+            if self.sample_interval is None:
+                continue  # ninguém olhando (rate_control idle)
+            rows = await loop.run_in_executor(None, self.processes.sample)
+            await self.wire.send(ws, self.process_encoder.encode(rows, time.time()))
+
+    async def on_connect(self, ws):
+        # Nova sessão: o servidor precisa de descriptor e keyframe de novo
+        self.encoder.reset()
+        self.process_encoder.reset()
+        self.wire.reset()
+        # e considera a taxa normal até mandar outro rate_control
+        self.set_rate(SAMPLE_INTERVAL)
+        await self.wire.send(ws, {
+            "type": "hello",
+            "role": "agent",
+            "token": TOKEN,
+            "agent_id": AGENT_ID,
+            "tags": AGENT_TAGS,
+            "heartbeat": HEARTBEAT_MODE,
+            "connection": self.connection.snapshot(),
+            **self.wire.hello_fields()
+        })
+        self.send_log("info", "Agent conectado")
+
+    async def on_message(self, ws, message):
+        data = self.wire.decode(message)
+
+        if self.wire.accept(data):
+            return
+
+        if data.get("type") == "rate_control":
             try:
-                async with websockets.connect(URL) as ws:
-                    await self.send_log(ws, "info", "Agent conectado")
+                self.set_rate(data.get("interval"))
+            except (TypeError, ValueError):
+                logger.warning("rate_control inválido: %s", data)
+            return
 
-                    await ws.send(json.dumps({
-                        "type": "hello",
-                        "role": "agent",
-                        "token": TOKEN
-                    }))
+        if data.get("type") != "command":
+            return
 
-                    asyncio.create_task(self.heartbeat(ws))
+        # Não espera o processo: o recv continua atendendo
+        await self.execute(data)
 
-                    while self.running:
-                        message = await ws.recv()
-                        data = json.loads(message)
+    async def listen(self):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self.shutdown)
+        loop.add_signal_handler(signal.SIGINT, self.shutdown)
 
-                        if data.get("type") != "command":
-                            continue
+        await self.connection.run()
+        await self.executor.cancel_all()
 
-                        feedback = self.execute(data.get("action"), data)
 
-                        await self.send_log(
-                            ws,
-                            "success" if feedback["status"] == "success" else "error",
-                            feedback["message"]
-                        )
+def shutdown_with_time(data):
+    minutes = data.get("minutes")
+    if not isinstance(minutes, int) or minutes <= 0:
+        raise ActionError("Minutos inválidos")
+    return ["sudo", "/sbin/shutdown", f"+{minutes}"]
 
-                        await ws.send(json.dumps({
-                            "type": "feedback",
-                            "role": "agent",
-                            **feedback
-                        }))
 
-            except Exception as e:
-                print("⚠️ Erro de conexão:", e)
-                await asyncio.sleep(5)  # retry
+def build_actions():
+    actions = ActionRegistry()
+    for name, command in ALLOWED.items():
+        actions.shell(name, command)
+    actions.shell("shutdown_with_time", shutdown_with_time)
+    for name, process_name in KILL_TARGETS.items():
+        actions.register(name, lambda data, process_name=process_name: kill_by_name(process_name))
+    actions.register("ping", partial(ping, targets=PING_TARGETS))
+    return actions
 
 
+setup_logging()
 agent = Agent()
-signal.signal(signal.SIGTERM, agent.shutdown)
-signal.signal(signal.SIGINT, agent.shutdown)
-
 asyncio.run(agent.listen())
@@ -0,0 +1,119 @@
+import asyncio
+import getpass
+import logging
+import os
+import socket
+import time
+
+import psutil
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_local_ip():
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))  # não envia nada de verdade
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception:
+        return "127.0.0.1"
+
+
+def read_cpu():
+    # interval=None mede a diferença desde a última chamada, sem dormir
+    return {"cpu_percent": psutil.cpu_percent(interval=None)}
+
+
+def read_memory():
+    memory = psutil.virtual_memory()
+    return {"memory": memory.used, "memory_total": memory.total}
+
+
+def read_disk():
+    disk = psutil.disk_usage("/")
+    return {"disk_usage": disk.used, "disk_total": disk.total}
+
+
+def read_network():
+    return {"ip_local": get_local_ip()}
+
+
+def read_host():
+    uname = os.uname()
+    return {
+        "system": uname.sysname,
+        "node_name": uname.nodename,
+        "user": getpass.getuser(),
+        "boot_time": psutil.boot_time(),
+    }
+
+
+SOURCES = {
+    "cpu": read_cpu,
+    "memory": read_memory,
+    "disk": read_disk,
+    "network": read_network,
+    "host": read_host,
+}
+
+# Folga para o jitter do loop não pular uma leitura que venceria agora
+SCHEDULE_SLACK = 0.25
+
+# Segundos entre leituras de cada fonte; entre elas o valor fica em cache
+DEFAULT_SCHEDULE = {
+    "cpu": 3,
+    "memory": 3,
+    "disk": 30,
+    "network": 60,
+    "host": 3600,
+}
+
+
+class MetricsCollector:
+    """Coleta o pc_info sem bloquear o event loop.
+
+    As leituras vencidas rodam juntas em uma thread do executor e cada
+    fonte tem seu próprio intervalo, então valores que quase não mudam
+    (IP, disco, dados do host) não são lidos a cada amostra.
+    """
+
+    def __init__(self, schedule=None):
+        self.schedule = {**DEFAULT_SCHEDULE, **(schedule or {})}
+        self._values = {}
+        self._next_read = {}
+        # Primeira chamada só inicializa a referência do delta de CPU
+        psutil.cpu_percent(interval=None)
+
+    def set_interval(self, interval, sources=("cpu", "memory")):
+        """As fontes rápidas acompanham a taxa de envio pedida pela API."""
+        for name in sources:
+            self.schedule[name] = interval
+            self._next_read.pop(name, None)
+
+    def _read_due(self, now):
+        for name, read in SOURCES.items():
+            if now + SCHEDULE_SLACK < self._next_read.get(name, 0):
+                continue
+            try:
+                self._values.update(read())
+            except Exception as e:
+                logger.warning("Erro ao ler %s: %s", name, e)
+            self._next_read[name] = now + self.schedule[name]
+
+    def sample(self):
+        now = time.monotonic()
+        self._read_due(now)
+        timestamp = time.time()
+        return {
+            "type": "pc_info",
+            **self._values,
+            "uptime": timestamp - self._values.get("boot_time", timestamp),
+            "timestamp": timestamp,
+        }
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.sample)
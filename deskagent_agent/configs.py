@@ -1,18 +1,83 @@
 from dotenv import load_dotenv
+from urllib.parse import urlparse
 import os
+import socket
 
 
 load_dotenv()
 TOKEN = os.getenv("AGENT_TOKEN")
 URL = os.getenv("PUBLIC_WS_URL")
+AGENT_ID = os.getenv("AGENT_ID") or socket.gethostname()
+# Tags para bulk_command, separadas por vírgula (ex.: "lab1,andar2")
+AGENT_TAGS = [tag.strip() for tag in os.getenv("AGENT_TAGS", "").split(",") if tag.strip()]
 
+# Protocolo preferido com a API: "msgpack" (binário) ou "json"
+WIRE_PROTOCOL = os.getenv("WIRE_PROTOCOL", "msgpack")
+
+# Reconexão: backoff exponencial com jitter entre 0 e min(cap, base * 2^n)
+RECONNECT_BASE = float(os.getenv("RECONNECT_BASE", "1"))
+RECONNECT_CAP = float(os.getenv("RECONNECT_CAP", "60"))
+
+# Liveness: "app" manda heartbeat a cada 5s; "ping" deixa a API vigiar a
+# conexão pelo ping/pong do WebSocket, sem mensagens de heartbeat
+HEARTBEAT_MODE = os.getenv("HEARTBEAT_MODE", "app")
+
+# Logs enviados em lotes (log_batch)
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "1000"))
+
+# Log local do processo (stderr, escrito por uma thread em segundo plano)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Intervalo entre amostras de pc_info (segundos)
+SAMPLE_INTERVAL = float(os.getenv("SAMPLE_INTERVAL", "3"))
+# Menor intervalo aceito num rate_control da API
+MIN_SAMPLE_INTERVAL = float(os.getenv("MIN_SAMPLE_INTERVAL", "0.5"))
+
+# Segundos entre leituras de cada fonte de métricas
+METRICS_SCHEDULE = {
+    "cpu": SAMPLE_INTERVAL,
+    "memory": SAMPLE_INTERVAL,
+    "disk": 30,
+    "network": 60,
+    "host": 3600,
+}
+
+# Top de processos por CPU e por memória (0 desliga o stream)
+PROCESS_TOP_N = int(os.getenv("PROCESS_TOP_N", "10"))
+PROCESS_INTERVAL = float(os.getenv("PROCESS_INTERVAL", "10"))
+
+# Amostras entre dois pc_info completos no protocolo delta
+TELEMETRY_KEYFRAME_EVERY = int(os.getenv("TELEMETRY_KEYFRAME_EVERY", "20"))
+
+# Execução de comandos
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "30"))
+MAX_CONCURRENT_COMMANDS = int(os.getenv("MAX_CONCURRENT_COMMANDS", "2"))
+
+# Ações privilegiadas: continuam no shell porque precisam de sudo
 ALLOWED = {
   "shutdown": "sudo /sbin/shutdown now",
   "reboot": "sudo /sbin/reboot",
   "suspend": "sudo /bin/systemctl suspend",
   "cancel": "sudo /bin/shutdown -t",
-  "ping": "makefoot",
-  "pkill_discord": "sudo /usr/bin/pkill Discord",
-  "pkill_chrome": "sudo /usr/bin/pkill Brave",
-  "pkill_code": "sudo /usr/bin/pkill code",
-}
\ No newline at end of file
+}
+
+# Hosts que a ação ping pode medir, com a porta usada: a API e os de
+# PING_HOSTS ("host" ou "host:porta", separados por vírgula). O comando não
+# escolhe a porta, para o agent não virar um scanner da rede local.
+PING_TARGETS = {}
+_api = urlparse(URL or "")
+if _api.hostname:
+    PING_TARGETS[_api.hostname] = _api.port or (443 if _api.scheme == "wss" else 80)
+for _entry in os.getenv("PING_HOSTS", "").split(","):
+    _host, _, _port = _entry.strip().partition(":")
+    if _host:
+        PING_TARGETS[_host] = int(_port or 80)
+
+# Ações pkill_*: encerram pelo nome do processo, sem sair do agent
+KILL_TARGETS = {
+  "pkill_discord": "Discord",
+  "pkill_chrome": "Brave",
+  "pkill_code": "code",
+}
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+import time
+
+import websockets
+
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff:
+    """Backoff exponencial com full jitter.
+
+    Cada espera é sorteada entre 0 e min(cap, base * factor ** tentativa),
+    então uma frota inteira que cai junto volta espalhada no tempo.
+    """
+
+    def __init__(self, base=1.0, cap=60.0, factor=2.0):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.attempt = 0
+
+    def next_delay(self):
+        ceiling = min(self.cap, self.base * self.factor ** self.attempt)
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class ConnectionManager:
+    """Mantém uma conexão WebSocket viva e supervisiona as tasks dela.
+
+    on_connect(ws) roda logo após conectar (hello etc.), on_message(ws, msg)
+    para cada mensagem recebida, e cada fábrica em `tasks` vira uma task
+    ligada ao socket: é cancelada quando ele fecha, e se morrer com erro
+    derruba o socket para forçar a reconexão.
+    """
+
+    def __init__(self, url, on_connect=None, on_message=None, tasks=(),
+                 backoff=None, stable_after=30, **connect_kwargs):
+        self.url = url
+        self.on_connect = on_connect
+        self.on_message = on_message
+        self.tasks = tasks
+        self.backoff = backoff or Backoff()
+        self.stable_after = stable_after
+        self.connect_kwargs = connect_kwargs
+        self.running = True
+        self._stopped = asyncio.Event()
+        self.ws = None
+        self.metrics = {
+            "connects": 0,
+            "failures": 0,
+            "last_error": None,
+            "last_delay": 0.0,
+            "connected_since": None,
+        }
+
+    def snapshot(self):
+        metrics = dict(self.metrics)
+        since = metrics.pop("connected_since")
+        metrics["uptime"] = time.time() - since if since else 0.0
+        return metrics
+
+    def _supervise(self, ws, task):
+        if task.cancelled() or task.exception() is None:
+            return
+        self.metrics["last_error"] = repr(task.exception())
+        asyncio.create_task(ws.close())
+
+    async def _session(self, ws):
+        self.ws = ws
+        self.metrics["connects"] += 1
+        self.metrics["connected_since"] = time.time()
+
+        if self.on_connect:
+            await self.on_connect(ws)
+
+        tasks = []
+        for factory in self.tasks:
+            task = asyncio.create_task(factory(ws))
+            task.add_done_callback(lambda t: self._supervise(ws, t))
+            tasks.append(task)
+
+        try:
+            async for message in ws:
+                if self.on_message:
+                    await self.on_message(ws, message)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.ws = None
+
+    async def run(self):
+        while self.running:
+            started = time.monotonic()
+            try:
+                async with websockets.connect(self.url, **self.connect_kwargs) as ws:
+                    await self._session(ws)
+            except Exception as e:
+                self.metrics["failures"] += 1
+                self.metrics["last_error"] = repr(e)
+                logger.warning("Erro de conexão: %s", e, extra={"failures": self.metrics["failures"]})
+            finally:
+                self.metrics["connected_since"] = None
+
+            if not self.running:
+                break
+
+            # Conexão que ficou de pé um tempo zera o backoff
+            if time.monotonic() - started >= self.stable_after:
+                self.backoff.reset()
+
+            delay = self.backoff.next_delay()
+            self.metrics["last_delay"] = delay
+            # stop() interrompe a espera
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        self.running = False
+        self._stopped.set()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+def simulate_herd(agents=1000, base=1.0, cap=60.0, rounds=3, bucket=0.1):
+    """Simula a frota reconectando após um restart da API.
+
+    Devolve, para cada rodada de falha, quantos agents tentam reconectar
+    em cada janela de `bucket` segundos.
+    """
+    backoffs = [Backoff(base, cap) for _ in range(agents)]
+    clocks = [0.0] * agents
+    histograms = []
+    for _ in range(rounds):
+        counts = {}
+        for i, backoff in enumerate(backoffs):
+            clocks[i] += backoff.next_delay()
+            slot = int(clocks[i] // bucket)
+            counts[slot] = counts.get(slot, 0) + 1
+        histograms.append(counts)
+    return histograms
+
+
+if __name__ == "__main__":
+    for n, counts in enumerate(simulate_herd(), start=1):
+        peak = max(counts.values())
+        print(f"rodada {n}: pico de {peak} reconexões em 100ms, {len(counts)} janelas ocupadas")
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+
+from actions import ActionError
+
+
+logger = logging.getLogger(__name__)
+
+
+class CommandExecutor:
+    """Executa comandos em segundo plano e reporta cada fase.
+
+    Cada comando passa por queued -> started -> finished, sempre com o
+    request_id recebido, para o app casar o feedback com o comando.
+    O loop de recv continua livre enquanto as ações rodam.
+    """
+
+    def __init__(self, report, max_concurrent=2, timeout=30):
+        self.report = report
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+
+    async def _report(self, context, **feedback):
+        try:
+            await self.report({**context, **feedback})
+        except Exception as e:
+            # Conexão caiu: o resultado se perde, mas o comando já rodou
+            logger.warning("Não foi possível enviar feedback: %s", e, extra={
+                "request_id": context.get("request_id"),
+                "phase": feedback.get("phase"),
+            })
+
+    async def submit(self, context, run):
+        """Enfileira `run`, uma execução já preparada pelo ActionRegistry."""
+        await self._report(
+            context,
+            status="info",
+            phase="queued",
+            message=f"Comando '{context['action']}' na fila"
+        )
+        task = asyncio.create_task(self._run(context, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, context, run):
+        async with self._semaphore:
+            await self._report(
+                context,
+                status="info",
+                phase="started",
+                message=f"Executando '{context['action']}'"
+            )
+
+            started = time.monotonic()
+            result = {"exit_code": None}
+            try:
+                result = await asyncio.wait_for(run(), self.timeout) or {}
+            except asyncio.TimeoutError:
+                status = "error"
+                message = f"Comando '{context['action']}' excedeu {self.timeout}s"
+            except ActionError as e:
+                status = "error"
+                message = f"Comando '{context['action']}' falhou: {e}"
+                result = {"exit_code": e.exit_code}
+            except Exception as e:
+                logger.exception("Erro no handler de '%s'", context["action"])
+                status = "error"
+                message = f"Comando '{context['action']}' falhou: {e}"
+            else:
+                status = "success"
+                result.setdefault("exit_code", 0)
+                message = result.pop("message", None) or f"Comando '{context['action']}' executado"
+
+            await self._report(
+                context,
+                **result,
+                status=status,
+                phase="finished",
+                message=message,
+                duration=round(time.monotonic() - started, 3)
+            )
+
+    async def cancel_all(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
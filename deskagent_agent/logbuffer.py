@@ -0,0 +1,77 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+
+class LogBuffer:
+    """Junta os logs do agent e envia em lotes (log_batch).
+
+    O lote sai quando chega a `max_batch` linhas ou `flush_interval`
+    segundos depois da primeira linha pendente. A fila guarda no máximo
+    `max_queue` linhas; o excesso é descartado e vira uma linha de resumo
+    no próximo lote.
+    """
+
+    def __init__(self, max_batch=50, flush_interval=0.5, max_queue=1000, encode=json.dumps):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = deque()
+        self._dropped = 0
+        self._pending = asyncio.Event()
+        self.stats = {"sent": 0, "batches": 0, "dropped": 0}
+
+    def add(self, level, message, source="agent"):
+        if len(self._queue) >= self.max_queue:
+            self._dropped += 1
+            self.stats["dropped"] += 1
+            return
+
+        self._queue.append({
+            "level": level,
+            "source": source,
+            "message": message,
+            "timestamp": time.time()
+        })
+        self._pending.set()
+
+    def _take_batch(self):
+        logs = []
+        if self._dropped:
+            logs.append({
+                "level": "warning",
+                "source": "agent",
+                "message": f"{self._dropped} logs descartados por excesso",
+                "timestamp": time.time()
+            })
+            self._dropped = 0
+
+        while self._queue and len(logs) < self.max_batch:
+            logs.append(self._queue.popleft())
+        return logs
+
+    async def run(self, ws):
+        """Task por conexão: esvazia a fila no socket atual."""
+        while True:
+            await self._pending.wait()
+
+            if len(self._queue) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+
+            logs = self._take_batch()
+            if not self._queue:
+                self._pending.clear()
+            if not logs:
+                continue
+
+            try:
+                await ws.send(self.encode({"type": "log_batch", "logs": logs}))
+            except Exception:
+                # Devolve o lote para a fila; sai na próxima conexão
+                self._queue.extendleft(reversed(logs))
+                raise
+
+            self.stats["sent"] += len(logs)
+            self.stats["batches"] += 1
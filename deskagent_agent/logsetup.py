@@ -0,0 +1,40 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from configs import LOG_LEVEL
+
+
+# Atributos padrão do LogRecord; o resto veio de `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def setup_logging():
+    """O event loop só enfileira; uma thread escreve no stderr.
+
+    O agente é um processo só e loga pouco, então fica no QueueHandler
+    padrão. Formato JSON e rate limit são coisa da API (control_app/log.py).
+    """
+    records = queue.SimpleQueue()
+    target = logging.StreamHandler()
+    target.setFormatter(TextFormatter())
+    listener = QueueListener(records, target)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(records)]
+    root.setLevel(LOG_LEVEL.upper())
@@ -0,0 +1,146 @@
+import heapq
+import time
+
+import psutil
+
+
+ATTRS = ("cpu_times", "memory_info")
+
+# rss arredondado para KiB: variações de poucos bytes não viram delta
+RSS_UNIT = 1024
+
+
+class ProcessSampler:
+    """Top N processos por CPU e por memória, com amostragem incremental.
+
+    Uma passada de `process_iter` por amostra lê só tempos de CPU e
+    memória de cada processo. O uso de CPU sai da diferença entre os
+    tempos desta amostra e os da anterior, guardados por PID, então não
+    há sleep nem segunda leitura. O nome só é lido para quem entra no
+    top e fica em cache por PID. PIDs que sumiram saem dos caches na
+    mesma passada.
+
+    cpu_percent segue o psutil: 100 é um núcleo inteiro.
+    """
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self._cpu = {}
+        self._names = {}
+        self._last = None
+
+    def sample(self):
+        """{pid: [name, cpu_percent, rss_kib]} com a união dos dois tops."""
+        now = time.monotonic()
+        elapsed = now - self._last if self._last is not None else None
+        self._last = now
+
+        previous = self._cpu
+        current = {}
+        rows = []
+        for proc in psutil.process_iter(ATTRS):
+            info = proc.info
+            cpu_times = info["cpu_times"]
+            memory = info["memory_info"]
+            if cpu_times is None or memory is None:
+                continue  # sem permissão ou morreu no meio da leitura
+
+            pid = proc.pid
+            total = cpu_times.user + cpu_times.system
+            current[pid] = total
+
+            before = previous.get(pid)
+            if elapsed and before is not None and total >= before:
+                cpu = round((total - before) / elapsed * 100, 1)
+            else:
+                cpu = 0.0  # processo novo (ou PID reaproveitado)
+            rows.append((proc, cpu, memory.rss // RSS_UNIT))
+
+        self._cpu = current
+
+        top = heapq.nlargest(self.top_n, rows, key=lambda row: row[1])
+        top += heapq.nlargest(self.top_n, rows, key=lambda row: row[2])
+
+        names = {}
+        for proc, cpu, rss in top:
+            name = self._names.get(proc.pid)
+            if name is None:
+                try:
+                    name = proc.name()
+                except psutil.Error:
+                    name = ""
+            names[proc.pid] = name
+        # Quem saiu do top perde o nome; se voltar, é lido de novo
+        self._names = names
+        return {str(proc.pid): [names[proc.pid], cpu, rss] for proc, cpu, rss in top}
+
+
+class ProcessEncoder:
+    """Transforma amostras do ProcessSampler no stream de processos.
+
+    processes        lista completa, a cada `keyframe_every` amostras
+    processes_delta  só as linhas que mudaram e os PIDs que saíram do top
+    """
+
+    def __init__(self, keyframe_every=20):
+        self.keyframe_every = keyframe_every
+        self.reset()
+
+    def reset(self):
+        # Chamar a cada nova conexão
+        self._last = {}
+        self._since_keyframe = 0
+
+    def encode(self, rows, timestamp):
+        if self._since_keyframe % self.keyframe_every == 0:
+            self._since_keyframe = 0
+            message = {
+                "type": "processes",
+                "timestamp": timestamp,
+                "rows": rows
+            }
+        else:
+            message = {
+                "type": "processes_delta",
+                "timestamp": timestamp,
+                "changes": {pid: row for pid, row in rows.items() if self._last.get(pid) != row},
+                "removed": [pid for pid in self._last if pid not in rows]
+            }
+
+        self._last = rows
+        self._since_keyframe += 1
+        return message
+
+
+if __name__ == "__main__":
+    # Benchmark: custo de CPU do sampler no agent (orçamento: < 1%)
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=3)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    sampler = ProcessSampler(args.top)
+    encoder = ProcessEncoder()
+    sizes = {"processes": [], "processes_delta": []}
+    busy = []
+
+    sampler.sample()
+    for _ in range(args.samples):
+        time.sleep(args.interval)
+        started = time.process_time()
+        message = encoder.encode(sampler.sample(), time.time())
+        busy.append(time.process_time() - started)
+        sizes[message["type"]].append(len(json.dumps(message)))
+
+    processes = len(psutil.pids())
+    average = sum(busy) / len(busy)
+    print(f"processos:       {processes}")
+    print(f"por amostra:     {average * 1000:.2f} ms de CPU (pior {max(busy) * 1000:.2f} ms)")
+    print(f"uso de CPU:      {average / args.interval * 100:.3f}% de um núcleo a cada {args.interval:g}s")
+    for msg_type, values in sizes.items():
+        if values:
+            print(f"{msg_type + ':':<17}{sum(values) / len(values):.0f} bytes em média")
@@ -0,0 +1,61 @@
+STATIC_FIELDS = (
+    "system",
+    "node_name",
+    "user",
+    "ip_local",
+    "memory_total",
+    "disk_total",
+    "boot_time",
+)
+
+# Campos que o servidor recalcula sozinho e não entram no delta
+DERIVED_FIELDS = ("type", "timestamp", "uptime")
+
+
+class TelemetryEncoder:
+    """Transforma amostras completas de pc_info no protocolo delta.
+
+    Envia o descriptor com os campos estáticos uma vez por sessão (ou
+    quando algum deles muda), um keyframe completo a cada
+    `keyframe_every` amostras e, entre eles, só os campos que mudaram.
+    """
+
+    def __init__(self, keyframe_every=20):
+        self.keyframe_every = keyframe_every
+        self.reset()
+
+    def reset(self):
+        # Chamar a cada nova conexão
+        self._static = None
+        self._last = {}
+        self._since_keyframe = 0
+
+    def encode(self, info):
+        messages = []
+
+        static = {k: info[k] for k in STATIC_FIELDS if k in info}
+        dynamic = {
+            k: v for k, v in info.items()
+            if k not in STATIC_FIELDS and k not in DERIVED_FIELDS
+        }
+
+        keyframe = self._since_keyframe % self.keyframe_every == 0
+        if static != self._static:
+            self._static = static
+            messages.append({"type": "pc_info_descriptor", **static})
+            keyframe = True
+
+        if keyframe:
+            self._since_keyframe = 0
+            messages.append({**info, "type": "pc_info"})
+        else:
+            changes = {k: v for k, v in dynamic.items() if self._last.get(k) != v}
+            messages.append({
+                "type": "pc_info_delta",
+                "timestamp": info["timestamp"],
+                "changes": changes,
+            })
+
+        self._last = dynamic
+        self._since_keyframe += 1
+        return messages
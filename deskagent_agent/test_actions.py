@@ -0,0 +1,22 @@
+# python -m unittest (a partir de deskagent_agent/)
+import asyncio
+import unittest
+
+from actions import ActionError, ping
+
+
+class PingTests(unittest.IsolatedAsyncioTestCase):
+    async def test_only_configured_hosts(self):
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        targets = {"127.0.0.1": port}
+
+        async with server:
+            result = await ping({"host": "127.0.0.1", "port": 22}, targets=targets, attempts=1)
+            self.assertIn(f"127.0.0.1:{port}", result["message"])
+
+            with self.assertRaises(ActionError):
+                await ping({"host": "192.168.0.10"}, targets=targets)
+
+        result = await ping({"timestamp": 1}, targets={})
+        self.assertEqual(result["echo"], 1)
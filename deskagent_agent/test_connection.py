@@ -0,0 +1,46 @@
+# python -m unittest (a partir de deskagent_agent/)
+import asyncio
+import random
+import time
+import unittest
+
+from connection import Backoff, ConnectionManager, simulate_herd
+
+
+class HerdTests(unittest.TestCase):
+    def setUp(self):
+        random.seed(15)
+
+    def test_reconnects_are_spread_out(self):
+        agents, bucket = 1000, 0.1
+        for n, counts in enumerate(simulate_herd(agents, base=1.0, cap=60.0, bucket=bucket)):
+            # Sem jitter a frota inteira cairia na mesma janela; com full
+            # jitter cada janela recebe perto de agents * bucket / teto
+            ceiling = min(60.0, 2.0 ** n)
+            expected = agents * bucket / ceiling
+            self.assertLess(max(counts.values()), expected * 1.5 + 10, f"rodada {n + 1}")
+
+    def test_delay_stays_under_cap(self):
+        backoff = Backoff(base=1.0, cap=5.0)
+        delays = [backoff.next_delay() for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 5.0 for delay in delays))
+        backoff.reset()
+        self.assertLessEqual(backoff.next_delay(), 1.0)
+
+
+class ConnectionManagerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_stop_interrupts_backoff(self):
+        # Porta fechada: falha na hora e entra num backoff longo
+        manager = ConnectionManager("ws://127.0.0.1:9", backoff=Backoff(base=60, cap=60))
+        task = asyncio.create_task(manager.run())
+        while manager.metrics["failures"] == 0:
+            await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        await manager.stop()
+        await asyncio.wait_for(task, 1)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Wire:
+    """Codificação das mensagens trocadas com a API.
+
+    Toda sessão começa em JSON. O hello oferece o protocolo preferido e,
+    quando a API confirma com hello_ack, os frames passam a ser binários
+    (MessagePack). Frames recebidos são decodificados pelo tipo: bytes
+    são MessagePack, texto é JSON.
+    """
+
+    def __init__(self, preferred="json"):
+        if preferred == "msgpack" and msgpack is None:
+            preferred = "json"
+        self.preferred = preferred
+        self.protocol = "json"
+
+    def reset(self):
+        # Nova conexão: volta ao JSON até o próximo hello_ack
+        self.protocol = "json"
+
+    def hello_fields(self):
+        if self.preferred == "json":
+            return {}
+        return {"protocols": [self.preferred, "json"]}
+
+    def accept(self, data):
+        """Trata o hello_ack; devolve True se a mensagem era o ack."""
+        if data.get("type") != "hello_ack":
+            return False
+        self.protocol = data.get("protocol", "json")
+        return True
+
+    def encode(self, message):
+        if self.protocol == "msgpack":
+            return msgpack.packb(message, use_bin_type=True)
+        return json.dumps(message)
+
+    def decode(self, frame):
+        if isinstance(frame, bytes):
+            return msgpack.unpackb(frame, raw=False)
+        return json.loads(frame)
+
+    async def send(self, ws, message):
+        await ws.send(self.encode(message))
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import AuditRecord
+
+
+@admin.register(AuditRecord)
+class AuditRecordAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "kind", "agent_id", "action", "status", "message")
+    list_filter = ("kind", "status")
+    search_fields = ("agent_id", "request_id")
+    date_hierarchy = "created_at"
@@ -0,0 +1,158 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditWriter:
+    """Grava o audit em segundo plano (write-behind).
+
+    O consumer só coloca um dict numa fila; uma thread junta até
+    `batch_size` registros, ou o que chegou em `flush_interval`
+    segundos, e grava com um único bulk_create. Com a fila cheia o
+    registro é descartado e contado em `dropped`, nunca bloqueia o loop.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_queue=100_000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def record(self, kind, agent_id, **fields):
+        self.ensure_started()
+        try:
+            self._queue.put_nowait({
+                "kind": kind,
+                "agent_id": agent_id or "",
+                "created_at": time.time(),
+                **fields
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=5):
+        """Grava o que falta e encerra a thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+
+        close_old_connections()
+
+    def _write(self, batch):
+        from .models import AuditRecord
+
+        records = [
+            AuditRecord(
+                kind=entry["kind"],
+                agent_id=entry["agent_id"],
+                request_id=entry.get("request_id") or "",
+                action=entry.get("action") or "",
+                status=entry.get("status") or "",
+                message=entry.get("message") or "",
+                payload=entry.get("payload") or {},
+                created_at=datetime.fromtimestamp(entry["created_at"], tz=timezone.utc)
+            )
+            for entry in batch
+        ]
+        try:
+            AuditRecord.objects.bulk_create(records)
+            self.written += len(records)
+        except Exception:
+            self.dropped += len(records)
+            logger.exception("Erro ao gravar audit", extra={"records": len(records)})
+            # Conexão pode ter ficado inválida; a próxima gravação reabre
+            close_old_connections()
+
+
+def query(agent_id=None, since=None, until=None, kind=None, limit=500):
+    """Registros mais recentes primeiro; usa o índice (agent_id, created_at)."""
+    from .models import AuditRecord
+
+    records = AuditRecord.objects.all()
+    if agent_id:
+        records = records.filter(agent_id=agent_id)
+    if since is not None:
+        records = records.filter(created_at__gte=datetime.fromtimestamp(since, tz=timezone.utc))
+    if until is not None:
+        records = records.filter(created_at__lt=datetime.fromtimestamp(until, tz=timezone.utc))
+    if kind:
+        records = records.filter(kind=kind)
+
+    return [
+        {**record, "created_at": record["created_at"].timestamp()}
+        for record in records.order_by("-created_at").values(
+            "kind", "agent_id", "request_id", "action", "status",
+            "message", "payload", "created_at"
+        )[:limit]
+    ]
+
+
+class _DisabledWriter:
+    def record(self, kind, agent_id, **fields):
+        pass
+
+
+_writer = None
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        if settings.AUDIT_ENABLED:
+            _writer = AuditWriter(
+                batch_size=settings.AUDIT_BATCH_SIZE,
+                flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+                max_queue=settings.AUDIT_MAX_QUEUE
+            )
+        else:
+            _writer = _DisabledWriter()
+    return _writer
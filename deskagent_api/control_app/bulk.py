@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+
+class BulkCommand:
+    """Agrega os feedbacks de um bulk_command num único fluxo para o app.
+
+    Os resultados que chegam são juntados e enviados em `bulk_result`
+    a cada `flush_interval` segundos. Quando todos respondem, ou quando
+    o prazo acaba, sai o resultado final; quem não respondeu a tempo
+    entra como "timeout".
+    """
+
+    def __init__(self, bulk_id, agent_ids, push, timeout, flush_interval):
+        self.bulk_id = bulk_id
+        self.total = len(agent_ids)
+        self.pending = set(agent_ids)
+        self.results = {}
+        self.push = push
+        self.deadline = time.monotonic() + timeout
+        self.flush_interval = flush_interval
+        self._new = []
+        self._done = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def add(self, agent_id, feedback):
+        if agent_id not in self.pending:
+            return
+        self.pending.discard(agent_id)
+
+        result = {
+            "agent_id": agent_id,
+            "status": feedback.get("status"),
+            "message": feedback.get("message")
+        }
+        for key in ("exit_code", "duration"):
+            if key in feedback:
+                result[key] = feedback[key]
+
+        self.results[agent_id] = result
+        self._new.append(result)
+        if not self.pending:
+            self._done.set()
+
+    def _message(self, results, final):
+        return {
+            "type": "bulk_result",
+            "bulk_id": self.bulk_id,
+            "results": results,
+            "done": len(self.results),
+            "total": self.total,
+            "final": final
+        }
+
+    async def _run(self):
+        while not self._done.is_set():
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._done.wait(), min(self.flush_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+            if self._new and not self._done.is_set():
+                self.push(self._message(self._new, final=False))
+                self._new = []
+
+        for agent_id in self.pending:
+            result = {"agent_id": agent_id, "status": "timeout", "message": "Sem resposta no prazo"}
+            self.results[agent_id] = result
+            self._new.append(result)
+        self.pending.clear()
+
+        self.push(self._message(self._new, final=True))
+        self._new = []
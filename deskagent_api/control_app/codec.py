@@ -0,0 +1,86 @@
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Protocolos de fio aceitos no hello, em ordem de preferência
+PROTOCOLS = ("msgpack", "json") if msgpack is not None else ("json",)
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
+
+
+def pack(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+@lru_cache(maxsize=128)
+def pack_text(text):
+    """MessagePack de um payload JSON de broadcast, uma vez por worker.
+
+    Só roda quando algum destinatário deste worker negociou msgpack; os
+    outros destinatários do mesmo broadcast reaproveitam o resultado.
+    """
+    return pack(loads(text))
+
+
+def negotiate(data):
+    """Escolhe o protocolo pedido no hello: `protocols` (lista) ou `protocol`."""
+    offered = data.get("protocols") or [data.get("protocol")]
+    for protocol in offered:
+        if protocol in PROTOCOLS:
+            return protocol
+    return "json"
+
+
+def broadcast_event(message, text=None):
+    """Evento de group_send com o payload já serializado.
+
+    Cada destinatário só repassa `text` para o socket; ninguém serializa
+    de novo. Quem negociou MessagePack converte com `pack_text`, sob
+    demanda, em vez de todo broadcast carregar as duas versões.
+    `message_type` e `agent_id` vão à parte para a fila de saída
+    aplicar a política sem decodificar o payload.
+    """
+    return {
+        "type": "broadcast_message",
+        "text": text if text is not None else dumps(message),
+        "message_type": message.get("type"),
+        "agent_id": message.get("agent_id"),
+    }
+
+
+def stamp_agent_id(text, agent_id):
+    """Acrescenta agent_id a um objeto JSON já codificado, sem decodificar.
+
+    A chave entra no fim, então prevalece sobre um agent_id que o
+    próprio cliente tenha mandado. Devolve None se o texto não for um
+    objeto JSON simples.
+    """
+    text = text.strip()
+    if len(text) < 2 or text[0] != "{" or text[-1] != "}":
+        return None
+    separator = "," if text[1:-1].strip() else ""
+    return f'{text[:-1]}{separator}"agent_id":{dumps(agent_id)}}}'
@@ -0,0 +1,35 @@
+from channels.layers import get_channel_layer
+
+from .audit import get_writer
+from .registry import registry
+
+
+async def dispatch_command(command, reply_to=None):
+    """Entrega um comando já validado ao canal do agent de destino.
+
+    `command` precisa ter agent_id e request_id. Devolve a mensagem de
+    erro para o app, ou None se o comando foi entregue.
+    """
+    agent_id = command["agent_id"]
+    channel_name = await registry.get_channel(agent_id)
+    if channel_name is None:
+        return f"Agent '{agent_id}' não está conectado"
+
+    await get_channel_layer().send(
+        channel_name,
+        {
+            "type": "deliver_command",
+            "message": {
+                **command,
+                "reply_to": reply_to
+            }
+        }
+    )
+    get_writer().record(
+        "command",
+        agent_id,
+        request_id=command.get("request_id"),
+        action=command.get("action"),
+        payload={k: v for k, v in command.items() if k not in ("type", "role")}
+    )
+    return None
@@ -1,9 +1,34 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
+import asyncio
+import logging
+import math
 import time
+import uuid
+from collections import OrderedDict
 
+from channels.db import database_sync_to_async
 from django.conf import settings
 
+from . import audit
+from .bulk import BulkCommand
+from .codec import (
+    broadcast_event, dumps, loads, negotiate, pack, pack_text, stamp_agent_id, unpack
+)
+from .commands import dispatch_command
+from .history import HistoryStore
+from .metrics import (
+    group_members, group_send_seconds, handshake_failures, messages_received,
+    rate_limited
+)
+from .outbox import Outbox
+from .presence import PresenceTable
+from .ratelimit import get_limiter
+from .registry import registry, telemetry_registry
+from .scheduler import Scheduler
+from .statecache import StateCache
+from .subscriptions import RateController
+from .telemetry import DELTA_TYPES, PROCESS_TYPES, ProcessStream, TelemetryStream
+
 
 APP_GROUP = "control_app_group"
 AGENT_GROUP = "control_agent_group"
@@ -11,14 +36,254 @@ AGENT_GROUP = "control_agent_group"
 INFO_APP_GROUP = "info_app_group"
 INFO_AGENT_GROUP = "info_agent_group"
 
-RATE_LIMIT_SECONDS = 2
-last_comands_time = {}
-class ControlConsumer(AsyncWebsocketConsumer):
+# Campos numéricos de ConnectionManager.snapshot() guardados no registro
+CONNECTION_FIELDS = ("connects", "failures", "last_delay", "uptime")
+
+logger = logging.getLogger(__name__)
+
+presence = PresenceTable(APP_GROUP)
+scheduler = Scheduler(APP_GROUP)
+state_cache = StateCache()
+rate_controller = RateController()
+history = HistoryStore()
+
+
+def connection_stats(value):
+    """Métricas de reconexão do hello do agent (ConnectionManager.snapshot)."""
+    if not isinstance(value, dict):
+        return None
+    stats = {
+        field: value[field] for field in CONNECTION_FIELDS
+        if isinstance(value.get(field), (int, float)) and not isinstance(value[field], bool)
+    }
+    if isinstance(value.get("last_error"), str):
+        stats["last_error"] = value["last_error"][:200]
+    return stats
+
+
+class BaseConsumer(AsyncWebsocketConsumer):
+    """Tudo que sai para o cliente passa pela fila limitada da conexão."""
 
     async def connect(self):
         await self.accept()
         self.role = None
-        print("📱 Websocket conectado")
+        self.agent_id = None
+        self.protocol = "json"
+        self.outbox = Outbox(
+            self.send_frame,
+            self.close_slow,
+            max_depth=settings.OUTBOX_MAX_DEPTH,
+            policies=settings.OUTBOX_POLICIES,
+            slow_timeout=settings.OUTBOX_SLOW_TIMEOUT
+        )
+        self.outbox.start()
+        presence.ensure_started()
+        state_cache.ensure_started()
+        # Jobs gravados antes de um restart voltam a disparar
+        scheduler.ensure_started()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            data = unpack(bytes_data)
+        else:
+            data = loads(text_data)
+
+        if isinstance(data, dict):
+            msg_type = data.get("type")
+            messages_received.inc(type(self).__name__, msg_type if isinstance(msg_type, str) else "invalid")
+            if data.get("type") == "ack":
+                received = data.get("received")
+                if isinstance(received, int) and not isinstance(received, bool):
+                    self.outbox.ack(received)
+                return
+            await self.handle_message(data, text_data)
+
+    def use_acks(self, data):
+        # Cliente que confirma os quadros recebidos ganha controle de fluxo
+        window = data.get("ack_window")
+        if isinstance(window, int) and not isinstance(window, bool) and window > 0:
+            self.outbox.use_acks(min(window, settings.OUTBOX_MAX_ACK_WINDOW))
+
+    def use_protocol(self, data):
+        """Chamado no hello aceito: responde hello_ack e troca o protocolo."""
+        self.use_acks(data)
+        if not data.get("protocols") and not data.get("protocol"):
+            return
+        protocol = negotiate(data)
+        # O ack ainda sai no protocolo antigo (JSON)
+        self.push({"type": "hello_ack", "protocol": protocol})
+        self.protocol = protocol
+
+    def encode(self, message):
+        return pack(message) if self.protocol == "msgpack" else dumps(message)
+
+    async def send_frame(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def send_message(self, message):
+        await self.send_frame(self.encode(message))
+
+    def push(self, message):
+        self.outbox.put(message.get("type"), self.encode(message), key=message.get("agent_id"))
+
+    async def group_broadcast(self, group, message, text=None):
+        # Serializa uma vez só, no remetente
+        event = broadcast_event(message, text)
+        with group_send_seconds.time(group):
+            await self.channel_layer.group_send(group, event)
+
+    async def join_group(self, group):
+        await self.channel_layer.group_add(group, self.channel_name)
+        group_members.inc(group)
+
+    async def leave_group(self, group):
+        await self.channel_layer.group_discard(group, self.channel_name)
+        group_members.dec(group)
+
+    async def close_slow(self):
+        logger.warning("Conexão lenta demais, desconectando", extra={"agent_id": self.agent_id})
+        await self.close()
+
+    async def liveness_expired(self, event):
+        # Sem heartbeat dentro do timeout: a presença já marcou offline
+        logger.warning("Agent sem sinal, desconectando", extra={"agent_id": self.agent_id})
+        await self.close()
+
+    async def broadcast_message(self, event):
+        if "text" not in event:
+            self.push(event["message"])
+            return
+
+        frame = event["text"]
+        if self.protocol == "msgpack":
+            frame = event.get("bytes") or pack_text(frame)
+        self.outbox.put(event["message_type"], frame, key=event.get("agent_id"))
+
+    async def send_state_replay(self, fields):
+        # Último estado conhecido de todos os agents, numa mensagem só
+        self.push(await state_cache.replay(fields))
+
+    async def send_error(self, message, request_id=None):
+        error = {
+            "type": "feedback",
+            "status": "error",
+            "message": message
+        }
+        if request_id:
+            error["request_id"] = request_id
+        self.push(error)
+
+    async def check_agent_token(self, data):
+        """Fecha a conexão se o hello do agent não traz o AGENT_TOKEN."""
+        if data.get("token") == settings.AGENT_TOKEN:
+            return True
+        handshake_failures.inc(type(self).__name__, "invalid_token")
+        # Envia direto: a conexão fecha antes da fila esvaziar
+        await self.send_message({
+            "type": "feedback",
+            "status": "error",
+            "message": "Token inválido"
+        })
+        await self.close()
+        return False
+
+    async def disconnect(self, close_code):
+        await self.outbox.close()
+
+
+class TelemetryMixin:
+    """Recebe a telemetria do agent (pc_info, deltas e top de processos).
+
+    Serve tanto a conexão única do agent (ControlConsumer) quanto a
+    conexão separada dos agents antigos (PCInfoConsumer). O registro em
+    telemetry_registry diz em qual canal está o histórico do agent.
+    """
+
+    def start_telemetry(self):
+        self.telemetry = TelemetryStream()
+        self.processes = ProcessStream()
+        self.telemetry_registered = False
+        rate_controller.ensure_started()
+
+    async def register_telemetry(self):
+        await telemetry_registry.register(self.agent_id, self.channel_name)
+        rate_controller.agent_connected(self.agent_id, self.channel_name)
+        self.telemetry_registered = True
+
+    async def handle_telemetry(self, data):
+        if not self.telemetry_registered:
+            await self.register_telemetry()
+
+        presence.seen(self.agent_id)
+        snapshot = self.telemetry.apply(data)
+        if snapshot is None:
+            return
+        history.record(self.agent_id, snapshot)
+
+        # Apps sempre recebem o pc_info completo
+        snapshot["type"] = "pc_info"
+        snapshot["agent_id"] = self.agent_id
+        state_cache.update_snapshot(self.agent_id, snapshot)
+        await self.group_broadcast(INFO_APP_GROUP, snapshot)
+
+    async def handle_processes(self, data):
+        presence.seen(self.agent_id)
+        top = self.processes.apply(data)
+        if top is None:
+            return
+
+        # Apps também recebem a lista completa, já ordenada por CPU
+        top["agent_id"] = self.agent_id
+        await self.group_broadcast(INFO_APP_GROUP, top)
+
+    async def history_query(self, event):
+        query = event["query"]
+        error = {
+            "type": "feedback",
+            "status": "error",
+            "message": f"Sem histórico para '{self.agent_id}'"
+        }
+        # Roda na conexão do agent: um evento ruim não pode derrubá-la
+        try:
+            result = history.query(
+                self.agent_id,
+                query.get("since"),
+                query.get("until"),
+                query.get("resolution")
+            ) or error
+        except Exception:
+            logger.exception("Erro na consulta de histórico", extra={"agent_id": self.agent_id})
+            result = {**error, "message": "Consulta de histórico inválida"}
+        await self.channel_layer.send(event["reply_to"], broadcast_event(result))
+
+    async def rate_control(self, event):
+        if self.role == "agent":
+            self.push(event["message"])
+
+    async def stop_telemetry(self):
+        if self.telemetry_registered:
+            rate_controller.agent_gone(self.agent_id, self.channel_name)
+            await telemetry_registry.unregister(self.agent_id, self.channel_name)
+            self.telemetry_registered = False
+
+
+class ControlConsumer(TelemetryMixin, BaseConsumer):
+    """Conexão dos apps e do agent.
+
+    O agent usa uma conexão só para comandos, feedback, logs e
+    telemetria; os apps continuam recebendo o pc_info em ws/pc_info/.
+    """
+
+    async def connect(self):
+        await super().connect()
+        self.start_telemetry()
+        # App: bulk_commands em andamento; agent: request_id -> (reply_to, bulk_id)
+        self.bulks = {}
+        self.bulk_routes = OrderedDict()
+        logger.debug("Websocket conectado")
 
 
     async def handle_handshake(self, data):
@@ -26,89 +291,297 @@ class ControlConsumer(AsyncWebsocketConsumer):
 
         if role == "app":
             self.role = "app"
-            await self.channel_layer.group_add(
-                APP_GROUP,
-                self.channel_name
-            )
-
-            print("APP registrado")
+            client = self.scope.get("client") or [self.channel_name]
+            # Rótulo nos logs e dono dos agendamentos; o cliente escolhe
+            self.user_id = data.get("user_id") or client[0]
+            # O rate limit não usa nada que o cliente escolha: é por conexão
+            self.rate_key = f"{client[0]}/{self.channel_name}"
+            await self.join_group(APP_GROUP)
+            self.use_protocol(data)
+            await self.send_presence_snapshot()
+            await self.send_state_replay(("feedback",))
+
+            logger.info("APP registrado", extra={"user_id": self.user_id})
 
         elif role == "agent":
-            token = data.get("token")
-            if token != settings.AGENT_TOKEN:
-                await self.send_error("Token inválido")
-                await self.close()
+            if not await self.check_agent_token(data):
                 return
             self.role = "agent"
-            await self.channel_layer.group_add(
-                AGENT_GROUP,
-                self.channel_name
+            self.agent_id = data.get("agent_id") or self.channel_name
+            tags = data.get("tags")
+            if not isinstance(tags, list):
+                tags = []
+            await registry.register(
+                self.agent_id,
+                self.channel_name,
+                tags=[tag for tag in tags if isinstance(tag, str)],
+                connection=connection_stats(data.get("connection"))
             )
-            print("AGENT registrado")
+            await self.join_group(AGENT_GROUP)
+            self.use_protocol(data)
+            # "ping": a conexão é vigiada pelo ping/pong do WebSocket, sem heartbeat
+            presence.connected(self.agent_id, self.channel_name, heartbeat=data.get("heartbeat", "app"))
+            logger.info("AGENT registrado", extra={"agent_id": self.agent_id})
+
+        else:
+            handshake_failures.inc(type(self).__name__, "invalid_role")
 
     async def handle_heartbeat(self):
         if self.role != "agent":
             return
-        await self.channel_layer.group_send(
-            APP_GROUP,
-            {
-                "type": "broadcast_message",
-                "message": {
-                    "type": "status",
-                    "online": True,
-                    "timestamp": time.time()
-                }
-            }
-        )
+        presence.seen(self.agent_id)
+
+    async def send_presence_snapshot(self):
+        self.push({
+            "type": "presence",
+            "full": True,
+            "agents": await presence.snapshot(),
+            "timestamp": time.time()
+        })
 
     async def handle_command(self, data):
         if self.role != "app":
             return
 
-        now = time.time()
-        last_time = last_comands_time.get(self.channel_name, 0)
-
-        if now - last_time < RATE_LIMIT_SECONDS:
-            await self.send(json.dumps({
-                "type": "feedback",
-                "status": "error",
-                "message": "Aguarde um pouco antes de enviar outro comando"
-            }))
+        # request_id acompanha o comando até o feedback do agent
+        request_id = data.get("request_id") or uuid.uuid4().hex
 
+        agent_id = data.get("agent_id")
+        if not agent_id:
+            # Sem destino explícito só é aceito quando há um único agent
+            agent_ids = await registry.agent_ids()
+            if len(agent_ids) != 1:
+                await self.send_error("Informe o agent_id do destino", request_id)
+                return
+            agent_id = agent_ids[0]
+
+        limiter = get_limiter()
+        rejected = None
+        if not await limiter.allow("app", self.rate_key):
+            rejected = "app"
+        elif not await limiter.allow("agent_action", agent_id, data.get("action")):
+            rejected = "agent_action"
+        if rejected:
+            rate_limited.inc(rejected)
+            await self.send_error("Aguarde um pouco antes de enviar outro comando", request_id)
             return
-        last_comands_time[self.channel_name] = now
-        
-        await self.channel_layer.group_send(
-            AGENT_GROUP,
-            {
-                "type": "broadcast_message",
-                "message": data
-            }
+
+        error = await dispatch_command(
+            {**data, "agent_id": agent_id, "request_id": request_id},
+            reply_to=self.channel_name
         )
+        if error:
+            await self.send_error(error, request_id)
+
+    async def handle_schedule_command(self, data):
+        if self.role != "app":
+            return
+
+        if not await get_limiter().allow("app", self.rate_key):
+            rate_limited.inc("app")
+            await self.send_error("Aguarde um pouco antes de enviar outro comando")
+            return
+
+        job, error = scheduler.build_job(data, owner=self.user_id)
+        if error:
+            await self.send_error(error)
+            return
+
+        scheduler.ensure_started()
+        await scheduler.add(job)
+        self.push({"type": "schedule", "event": "created", "job": job})
+
+    async def handle_cancel_schedule(self, data):
+        if self.role != "app":
+            return
+
+        job_id = data.get("job_id")
+        if not job_id or not await scheduler.cancel(job_id):
+            await self.send_error(f"Agendamento '{job_id}' não encontrado")
+            return
+        self.push({"type": "schedule", "event": "cancelled", "job_id": job_id})
+
+    async def handle_list_schedules(self, data):
+        if self.role != "app":
+            return
+
+        owner = self.user_id if data.get("mine") else None
+        self.push({"type": "schedules", "jobs": await scheduler.list(owner)})
 
     async def handle_feedback(self, data):
         if self.role != "agent":
             return
         
-        await self.channel_layer.group_send(
-            APP_GROUP,
-            {
-                "type": "broadcast_message",
-                "message": data
-            }
-        )
+        data = {**data, "agent_id": self.agent_id}
+        data.pop("reply_to", None)
+
+        if data.get("phase", "finished") == "finished":
+            audit.get_writer().record(
+                "feedback",
+                self.agent_id,
+                request_id=data.get("request_id"),
+                action=data.get("action"),
+                status=data.get("status"),
+                message=data.get("message"),
+                payload={
+                    key: data[key] for key in ("exit_code", "duration", "job_id")
+                    if key in data
+                }
+            )
 
-    async def handle_log(self, data):
-        await self.channel_layer.group_send(
-            "control_app_group",
-            {
-                "type": "broadcast_message",
+        # Feedback de bulk_command vai só para quem pediu, já agregado
+        route = self.bulk_routes.get(data.get("request_id"))
+        if route is not None:
+            if data.get("phase", "finished") != "finished":
+                return
+            del self.bulk_routes[data["request_id"]]
+            reply_to, bulk_id = route
+            await self.channel_layer.send(reply_to, {
+                "type": "bulk_feedback",
+                "bulk_id": bulk_id,
                 "message": data
-            }
+            })
+            return
+
+        state_cache.add_feedback(self.agent_id, data)
+        await self.group_broadcast(APP_GROUP, data)
+
+    async def handle_bulk_command(self, data):
+        if self.role != "app":
+            return
+
+        bulk_id = data.get("bulk_id") or uuid.uuid4().hex
+        if bulk_id in self.bulks:
+            await self.send_error(f"bulk_id '{bulk_id}' já está em andamento")
+            return
+
+        if isinstance(data.get("agent_ids"), list):
+            agent_ids = list(dict.fromkeys(
+                agent_id for agent_id in data["agent_ids"] if isinstance(agent_id, str)
+            ))
+        elif isinstance(data.get("tags"), list) and data["tags"]:
+            if not all(isinstance(tag, str) for tag in data["tags"]):
+                await self.send_error("tags deve ser uma lista de strings")
+                return
+            agent_ids = await registry.find_by_tags(data["tags"])
+        else:
+            await self.send_error("Informe agent_ids ou tags")
+            return
+
+        if not agent_ids:
+            await self.send_error("Nenhum agent corresponde ao filtro")
+            return
+        if len(agent_ids) > settings.BULK_MAX_TARGETS:
+            await self.send_error(f"Máximo de {settings.BULK_MAX_TARGETS} agents por bulk_command")
+            return
+
+        try:
+            timeout = float(data.get("timeout") or settings.BULK_DEFAULT_TIMEOUT)
+        except (TypeError, ValueError):
+            timeout = math.nan
+        if not math.isfinite(timeout):
+            # NaN passaria pelo min/max e o bulk nunca terminaria
+            await self.send_error("'timeout' inválido")
+            return
+        timeout = min(max(timeout, 1), settings.BULK_MAX_TIMEOUT)
+
+        # Um bulk conta como um comando no limite do app
+        limiter = get_limiter()
+        if not await limiter.allow("app", self.rate_key):
+            rate_limited.inc("app")
+            await self.send_error("Aguarde um pouco antes de enviar outro comando")
+            return
+
+        bulk = BulkCommand(
+            bulk_id, agent_ids, self.push, timeout, settings.BULK_FLUSH_INTERVAL
         )
+        self.bulks[bulk_id] = bulk
+        bulk.start().add_done_callback(lambda _: self.bulks.pop(bulk_id, None))
+
+        command = {
+            key: value for key, value in data.items()
+            if key not in ("type", "agent_ids", "tags", "timeout")
+        }
+
+        async def send_one(agent_id):
+            if not await limiter.allow("agent_action", agent_id, data.get("action")):
+                rate_limited.inc("agent_action")
+                return "Aguarde um pouco antes de enviar outro comando"
+            return await dispatch_command({
+                **command,
+                "type": "command",
+                "agent_id": agent_id,
+                "request_id": f"{bulk_id}:{agent_id}",
+                "bulk_id": bulk_id
+            }, reply_to=self.channel_name)
+
+        errors = await asyncio.gather(*(send_one(agent_id) for agent_id in agent_ids))
+        for agent_id, error in zip(agent_ids, errors):
+            if error:
+                bulk.add(agent_id, {"status": "error", "message": error})
+
+    async def bulk_feedback(self, event):
+        bulk = self.bulks.get(event["bulk_id"])
+        if bulk is not None:
+            message = event["message"]
+            bulk.add(message["agent_id"], message)
+
+    async def relay(self, data, text_data):
+        # Caminho rápido: repassa o texto original só acrescentando o agent_id
+        text = text_data
+        if text_data is not None and self.agent_id:
+            text = stamp_agent_id(text_data, self.agent_id)
+        await self.group_broadcast(APP_GROUP, {**data, "agent_id": self.agent_id}, text)
+
+    def audit_logs(self, logs):
+        if self.role != "agent" or not settings.AUDIT_LOGS:
+            return
+        writer = audit.get_writer()
+        for log in logs:
+            if isinstance(log, dict):
+                writer.record(
+                    "log",
+                    self.agent_id,
+                    status=log.get("level"),
+                    message=log.get("message")
+                )
+
+    async def handle_log(self, data, text_data):
+        self.audit_logs([data])
+        await self.relay(data, text_data)
+
+    async def handle_log_batch(self, data, text_data):
+        if self.role != "agent":
+            return
+
+        logs = data.get("logs")
+        if not isinstance(logs, list) or not logs:
+            return
+
+        self.audit_logs(logs)
+        # Um único group_send para o lote inteiro
+        await self.relay(data, text_data)
+
+    async def handle_audit(self, data):
+        if self.role != "app":
+            return
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+        try:
+            limit = min(int(data.get("limit") or 200), settings.AUDIT_QUERY_LIMIT)
+            records = await database_sync_to_async(audit.query)(
+                agent_id=data.get("agent_id"),
+                since=data.get("since"),
+                until=data.get("until"),
+                kind=data.get("kind"),
+                limit=limit
+            )
+        except (TypeError, ValueError, OverflowError):
+            await self.send_error("Filtro de audit inválido")
+            return
+
+        self.push({"type": "audit", "records": records})
+
+    async def handle_message(self, data, text_data):
         msg_type = data.get("type")
 
         if msg_type == "hello":
@@ -116,6 +589,7 @@ class ControlConsumer(AsyncWebsocketConsumer):
             return
         
         if not self.role:
+            handshake_failures.inc(type(self).__name__, "no_handshake")
             await self.send_error("Handshake não realizado!")
             return
         
@@ -124,11 +598,39 @@ class ControlConsumer(AsyncWebsocketConsumer):
             await self.handle_heartbeat()
             return
 
+        # 🔹 SNAPSHOT DE PRESENÇA PEDIDO PELO APP
+        if msg_type == "presence" and self.role == "app":
+            await self.send_presence_snapshot()
+            return
+
         # 🔹 COMANDO VINDO DO APP
         if msg_type == "command":
             await self.handle_command(data)
             return
         
+        # 🔹 COMANDO PARA VÁRIOS AGENTS
+        if msg_type == "bulk_command":
+            await self.handle_bulk_command(data)
+            return
+
+        # 🔹 CONSULTA AO AUDIT
+        if msg_type == "audit":
+            await self.handle_audit(data)
+            return
+
+        # 🔹 AGENDAMENTOS DO APP
+        if msg_type == "schedule_command":
+            await self.handle_schedule_command(data)
+            return
+
+        if msg_type == "cancel_schedule":
+            await self.handle_cancel_schedule(data)
+            return
+
+        if msg_type == "list_schedules":
+            await self.handle_list_schedules(data)
+            return
+
         # 🔹 FEEDBACK DO AGENT → REPASSA PARA O APP
         if msg_type == "feedback":
             await self.handle_feedback(data)
@@ -136,101 +638,175 @@ class ControlConsumer(AsyncWebsocketConsumer):
 
         # 🔹 LOG DO AGENT → APP
         if msg_type == "log":
-           await self.handle_log(data)
+           await self.handle_log(data, text_data)
            return
 
+        # 🔹 LOTE DE LOGS DO AGENT → APP
+        if msg_type == "log_batch":
+            await self.handle_log_batch(data, text_data)
+            return
 
-    async def broadcast_message(self, event):
-        await self.send(json.dumps(event["message"]))
+        # 🔹 TELEMETRIA DO AGENT → APPS DO PC INFO
+        if msg_type in DELTA_TYPES and self.role == "agent":
+            await self.handle_telemetry(data)
+            return
 
-    async def send_error(self, message):
-        await self.send(json.dumps({
-            "type": "feedback",
-            "status": "error",
-            "message": message
-        }))
+        # 🔹 TOP DE PROCESSOS DO AGENT → APPS DO PC INFO
+        if msg_type in PROCESS_TYPES and self.role == "agent":
+            await self.handle_processes(data)
+            return
+
+    async def deliver_command(self, event):
+        if self.role != "agent":
+            return
+
+        message = event["message"]
+        if message.get("bulk_id") and message.get("reply_to"):
+            self.bulk_routes[message["request_id"]] = (message["reply_to"], message["bulk_id"])
+            if len(self.bulk_routes) > settings.BULK_MAX_ROUTES:
+                self.bulk_routes.popitem(last=False)
+        self.push(message)
 
     async def disconnect(self, close_code):
+        await super().disconnect(close_code)
+        for bulk in list(self.bulks.values()):
+            bulk.cancel()
         if self.role == "app":
-            await self.channel_layer.group_discard(
-                APP_GROUP,
-                self.channel_name
-            )
+            await self.leave_group(APP_GROUP)
         elif self.role == "agent":
-            await self.channel_layer.group_discard(
-                AGENT_GROUP,
-                self.channel_name
-            )
+            presence.disconnected(self.agent_id, self.channel_name)
+            state_cache.agent_gone(self.agent_id)
+            await registry.unregister(self.agent_id, self.channel_name)
+            await self.stop_telemetry()
+            await self.leave_group(AGENT_GROUP)
+
+        logger.debug("Websocket desconectado", extra={"role": self.role, "agent_id": self.agent_id})
 
-        print("❌ Websocket desconectado")
 
+class PCInfoConsumer(TelemetryMixin, BaseConsumer):
+    """Apps recebem o pc_info aqui; agents antigos ainda enviam por aqui."""
 
-class PCInfoConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.accept()
-        self.role = None
-        print("📱 PC Info Websocket conectado")
+        await super().connect()
+        self.start_telemetry()
+        logger.debug("PC Info Websocket conectado")
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def handle_message(self, data, text_data):
         msg_type = data.get("type")
         role = data.get("role")
 
         if msg_type == "hello":
             if role == "app":
                 self.role = "app"
-                await self.channel_layer.group_add(
-                    INFO_APP_GROUP,
-                    self.channel_name
-                )
-                print("PC INFO APP registrado")
+                await self.join_group(INFO_APP_GROUP)
+                # Até mandar subscribe, o app acompanha todos os agents
+                await rate_controller.subscribe(self.channel_name)
+                self.use_protocol(data)
+                await self.send_state_replay(("snapshot",))
+                logger.info("PC INFO APP registrado")
             elif role == "agent":
+                if not await self.check_agent_token(data):
+                    return
                 self.role = "agent"
-                await self.channel_layer.group_add(
-                    INFO_AGENT_GROUP,
-                    self.channel_name
-                )
-                print("PC INFO AGENT registrado")
+                self.agent_id = data.get("agent_id") or self.channel_name
+                await self.register_telemetry()
+                await self.join_group(INFO_AGENT_GROUP)
+                self.use_protocol(data)
+                presence.connected(self.agent_id, self.channel_name)
+                logger.info("PC INFO AGENT registrado", extra={"agent_id": self.agent_id})
+            else:
+                handshake_failures.inc(type(self).__name__, "invalid_role")
             return
         
         if msg_type == "heartbeat":
             if self.role != "agent":
                 return
-            await self.channel_layer.group_send(
-                APP_GROUP,
-                {
-                    "type": "broadcast_message",
-                    "message": {
-                        "type": "status",
-                        "online": True,
-                        "timestamp": time.time()
-                    }
-                }
-            )
+            presence.seen(self.agent_id)
 
-        
-        if msg_type == "pc_info" and self.role == "agent":
-            await self.channel_layer.group_send(
-                INFO_APP_GROUP,
+        if msg_type == "history" and self.role == "app":
+            await self.handle_history(data)
+            return
+
+        if msg_type == "subscribe" and self.role == "app":
+            await self.handle_subscribe(data)
+            return
+
+        if msg_type in DELTA_TYPES and self.role == "agent":
+            await self.handle_telemetry(data)
+
+        if msg_type in PROCESS_TYPES and self.role == "agent":
+            await self.handle_processes(data)
+
+    async def handle_subscribe(self, data):
+        agent_ids = data.get("agent_ids")
+        if agent_ids is not None and not (
+            isinstance(agent_ids, list) and all(isinstance(a, str) for a in agent_ids)
+        ):
+            await self.send_error("agent_ids deve ser uma lista")
+            return
+
+        focus = data.get("focus")
+        if not isinstance(focus, str):
+            focus = None
+        await rate_controller.subscribe(self.channel_name, agent_ids, focus)
+
+    async def handle_history(self, data):
+        agent_id = data.get("agent_id")
+        if not agent_id:
+            await self.send_error("Informe o agent_id")
+            return
+
+        # Valida aqui: a consulta roda na conexão do agent
+        query = {}
+        for field in ("since", "until", "resolution"):
+            value = data.get(field)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = math.nan
+            if not math.isfinite(value) or value < 0:
+                await self.send_error(f"'{field}' inválido")
+                return
+            query[field] = value
+        if "since" in query and "until" in query and query["since"] > query["until"]:
+            await self.send_error("'since' deve ser anterior a 'until'")
+            return
+
+        # O histórico fica no worker que recebe a telemetria do agent
+        channel_name = await telemetry_registry.get_channel(agent_id)
+        if channel_name is not None:
+            await self.channel_layer.send(
+                channel_name,
                 {
-                    "type": "broadcast_message",
-                    "message": data
+                    "type": "history_query",
+                    "reply_to": self.channel_name,
+                    "query": query
                 }
             )
+            return
 
-    async def broadcast_message(self, event):
-        await self.send(json.dumps(event["message"]))
+        result = history.query(
+            agent_id,
+            query.get("since"),
+            query.get("until"),
+            query.get("resolution")
+        )
+        if result is None:
+            await self.send_error(f"Sem histórico para '{agent_id}'")
+            return
+        self.push(result)
 
     async def disconnect(self, close_code):
+        await super().disconnect(close_code)
         if self.role == "app":
-            await self.channel_layer.group_discard(
-                INFO_APP_GROUP,
-                self.channel_name
-            )
+            await rate_controller.unsubscribe(self.channel_name)
+            await self.leave_group(INFO_APP_GROUP)
         elif self.role == "agent":
-            await self.channel_layer.group_discard(
-                INFO_AGENT_GROUP,
-                self.channel_name
-            )
+            presence.disconnected(self.agent_id, self.channel_name)
+            state_cache.agent_gone(self.agent_id)
+            await self.stop_telemetry()
+            await self.leave_group(INFO_AGENT_GROUP)
 
-        print("❌ PC Info Websocket desconectado")
\ No newline at end of file
+        logger.debug("PC Info Websocket desconectado", extra={"role": self.role, "agent_id": self.agent_id})
\ No newline at end of file
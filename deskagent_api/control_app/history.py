@@ -0,0 +1,195 @@
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+SERIES = ("cpu_percent", "memory", "disk_usage")
+
+
+class Tier:
+    """Ring buffer de tamanho fixo com uma coluna tipada por série.
+
+    Timestamps em segundos inteiros (uint32) e valores em float32:
+    16 bytes por ponto com as três séries.
+    """
+
+    def __init__(self, step, size):
+        self.step = step
+        self.size = size
+        self.timestamps = array("I", bytes(4 * size))
+        self.columns = {name: array("f", bytes(4 * size)) for name in SERIES}
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, values):
+        i = self.head
+        self.timestamps[i] = int(timestamp)
+        for name in SERIES:
+            self.columns[name][i] = values[name]
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def _slot(self, n):
+        # n-ésimo ponto mais antigo -> posição física no buffer
+        return (self.head - self.count + n) % self.size
+
+    def _bisect(self, timestamp, right=False):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.timestamps[self._slot(mid)]
+            if value < timestamp or (right and value == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def oldest(self):
+        return self.timestamps[self._slot(0)] if self.count else None
+
+    def window(self, since, until):
+        start = self._bisect(since)
+        end = self._bisect(until, right=True)
+        slots = [self._slot(n) for n in range(start, end)]
+        points = {"timestamp": [self.timestamps[i] for i in slots]}
+        for name in SERIES:
+            column = self.columns[name]
+            points[name] = [column[i] for i in slots]
+        return points
+
+    def nbytes(self):
+        return sum(
+            col.itemsize * len(col)
+            for col in (self.timestamps, *self.columns.values())
+        )
+
+
+class Rollup:
+    """Acumula amostras e grava a média de cada intervalo fechado no tier.
+
+    O intervalo em andamento só entra no tier quando o próximo começa;
+    até lá as consultas o leem de `current()`.
+    """
+
+    def __init__(self, tier):
+        self.tier = tier
+        self.bucket = None
+        self.sums = dict.fromkeys(SERIES, 0.0)
+        self.count = 0
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp) // self.tier.step
+        if bucket != self.bucket:
+            self.close()
+            self.bucket = bucket
+        for name in SERIES:
+            self.sums[name] += values[name]
+        self.count += 1
+
+    def current(self):
+        """(timestamp, médias) do intervalo ainda aberto, ou None."""
+        if not self.count:
+            return None
+        return self.bucket * self.tier.step, {
+            name: total / self.count for name, total in self.sums.items()
+        }
+
+    def close(self):
+        if self.count:
+            self.tier.append(
+                self.bucket * self.tier.step,
+                {name: total / self.count for name, total in self.sums.items()}
+            )
+        self.sums = dict.fromkeys(SERIES, 0.0)
+        self.count = 0
+
+
+class AgentHistory:
+    def __init__(self, tiers):
+        self.raw = Tier(*tiers[0])
+        self.rollups = [Rollup(Tier(*spec)) for spec in tiers[1:]]
+
+    @property
+    def tiers(self):
+        return [self.raw, *(rollup.tier for rollup in self.rollups)]
+
+    def record(self, timestamp, values):
+        self.raw.append(timestamp, values)
+        for rollup in self.rollups:
+            rollup.add(timestamp, values)
+
+    def pick_tier(self, span, resolution=None):
+        tiers = self.tiers
+        for tier in tiers:
+            if resolution and tier.step >= resolution:
+                return tier
+            # Sem resolução pedida: o tier mais fino cuja retenção cobre a janela
+            if not resolution and tier.step * tier.size >= span:
+                return tier
+        return tiers[-1]
+
+    def query(self, since, until, resolution=None):
+        tier = self.pick_tier(until - since, resolution)
+        points = tier.window(since, until)
+        for rollup in self.rollups:
+            current = rollup.current() if rollup.tier is tier else None
+            if current is not None and since <= current[0] <= until:
+                timestamp, values = current
+                points["timestamp"].append(timestamp)
+                for name in SERIES:
+                    points[name].append(values[name])
+        return tier.step, points
+
+    def nbytes(self):
+        return sum(tier.nbytes() for tier in self.tiers)
+
+
+class HistoryStore:
+    """Histórico por agent deste worker, limitado a HISTORY_MAX_AGENTS."""
+
+    def __init__(self, tiers=None, max_agents=None):
+        self.tiers = tiers or settings.HISTORY_TIERS
+        self.max_agents = max_agents or settings.HISTORY_MAX_AGENTS
+        self._agents = OrderedDict()
+
+    def record(self, agent_id, snapshot):
+        try:
+            values = {name: float(snapshot[name]) for name in SERIES}
+        except (KeyError, TypeError, ValueError):
+            return
+
+        history = self._agents.get(agent_id)
+        if history is None:
+            history = self._agents[agent_id] = AgentHistory(self.tiers)
+            if len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+        else:
+            self._agents.move_to_end(agent_id)
+
+        history.record(snapshot.get("timestamp") or time.time(), values)
+
+    def query(self, agent_id, since=None, until=None, resolution=None):
+        history = self._agents.get(agent_id)
+        if history is None:
+            return None
+
+        until = until or time.time()
+        since = since if since is not None else until - 3600
+        step, points = history.query(since, until, resolution)
+        return {
+            "type": "history",
+            "agent_id": agent_id,
+            "resolution": step,
+            "since": since,
+            "until": until,
+            "points": points,
+        }
+
+    def nbytes(self):
+        return sum(history.nbytes() for history in self._agents.values())
+
+    def __len__(self):
+        return len(self._agents)
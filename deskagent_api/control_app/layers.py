@@ -0,0 +1,18 @@
+from channels_redis.core import RedisChannelLayer
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer que entrega canais específicos com vários shards.
+
+    No channels_redis, `send` escolhe o shard pelo nome completo do canal
+    ("specific.<cliente>!<id>"), mas `receive` lê do shard do nome sem o
+    id ("specific.<cliente>!"). Com mais de um host em REDIS_URLS, metade
+    das mensagens diretas (deliver_command, history_query...) ia para um
+    shard que ninguém lê. Aqui o hash de um canal específico usa sempre a
+    parte até o "!", a mesma que o receive e o group_send usam.
+    """
+
+    def consistent_hash(self, value):
+        if "!" in value:
+            value = value[:value.index("!") + 1]
+        return super().consistent_hash(value)
@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vai para o JSON
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class BackgroundHandler(QueueHandler):
+    """Handler que só enfileira; uma thread separada escreve no stream.
+
+    Quem loga (o event loop) nunca espera I/O. Se a fila encher, o
+    registro é descartado e contado em `dropped`.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def setFormatter(self, fmt):
+        # A formatação acontece na thread de escrita
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve a mensagem aqui: os args podem mudar depois de enfileirados
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível com os campos de `extra` no fim, como chave=valor."""
+
+    def __init__(self, fmt="%(asctime)s %(levelname)s %(name)s %(message)s", **kwargs):
+        super().__init__(fmt, **kwargs)
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, incluindo os campos passados em `extra`."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket por (logger, mensagem) para eventos ruidosos.
+
+    Registros acima de `rate`/s (com rajada `burst`) são suprimidos; o
+    próximo que passar leva a contagem em `suppressed`. WARNING ou acima
+    nunca é suprimido.
+    """
+
+    def __init__(self, rate=10, burst=50, max_keys=1000):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        tokens, last, suppressed = self._buckets.pop(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+            if suppressed:
+                record.suppressed = suppressed
+                suppressed = 0
+        else:
+            suppressed += 1
+
+        self._buckets[key] = (tokens, now, suppressed)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
@@ -0,0 +1,49 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from control_app.audit import AuditWriter, query
+from control_app.models import AuditRecord
+
+
+class Command(BaseCommand):
+    help = "Mede a vazão sustentada de gravação do audit (write-behind + bulk_create)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=100_000)
+        parser.add_argument("--agents", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--keep", action="store_true", help="não apaga os registros no fim")
+
+    def handle(self, *args, records, agents, batch_size, keep, **options):
+        writer = AuditWriter(batch_size=batch_size, flush_interval=0.5, max_queue=records + 1)
+        # Prefixo único: a limpeza no fim só apaga os registros desta execução
+        prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+
+        # Lado do consumer: só enfileira
+        started = time.perf_counter()
+        for i in range(records):
+            writer.record(
+                "log",
+                f"{prefix}{i % agents}",
+                status="info",
+                message=f"linha de log {i}"
+            )
+        enqueued = time.perf_counter() - started
+
+        # Lado do disco: espera a thread gravar tudo
+        writer.stop(timeout=None)
+        elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows = query(agent_id=f"{prefix}0", since=time.time() - 3600, limit=500)
+        query_time = time.perf_counter() - started
+
+        self.stdout.write(f"registros:        {writer.written} gravados, {writer.dropped} descartados")
+        self.stdout.write(f"enfileirar:       {enqueued / records * 1e6:.2f} µs por registro")
+        self.stdout.write(f"vazão sustentada: {writer.written / elapsed:,.0f} registros/s")
+        self.stdout.write(f"consulta:         {len(rows)} linhas de um agent em {query_time * 1000:.1f} ms")
+
+        if not keep:
+            AuditRecord.objects.filter(agent_id__startswith=prefix).delete()
@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from control_app import codec
+
+
+SAMPLE = {
+    "type": "pc_info",
+    "agent_id": "desk-01",
+    "cpu_percent": 12.5,
+    "memory": 8_123_456_789,
+    "memory_total": 16_000_000_000,
+    "disk_usage": 210_000_000_000,
+    "disk_total": 500_000_000_000,
+    "uptime": 123456.7,
+    "boot_time": 1_700_000_000.0,
+    "timestamp": 1_700_123_456.7,
+    "system": "Linux",
+    "node_name": "desk-01",
+    "user": "renildo",
+    "ip_local": "192.168.0.10",
+}
+
+
+class Command(BaseCommand):
+    help = "Compara o custo de CPU por mensagem em fan-out: dumps por destinatário vs. uma vez"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=200)
+        parser.add_argument("--messages", type=int, default=2000)
+
+    def handle(self, *args, recipients, messages, **options):
+        text = json.dumps(SAMPLE)
+
+        # Antes: receive decodifica, cada destinatário codifica de novo
+        started = time.process_time()
+        for _ in range(messages):
+            message = json.loads(text)
+            for _ in range(recipients):
+                json.dumps(message)
+        before = (time.process_time() - started) / messages
+
+        # Depois: decodifica uma vez, codifica uma vez, destinatários só repassam
+        started = time.process_time()
+        for _ in range(messages):
+            message = codec.loads(text)
+            event = codec.broadcast_event(message)
+            for _ in range(recipients):
+                event["text"]
+        after = (time.process_time() - started) / messages
+
+        codec_name = "orjson" if codec.orjson is not None else "json"
+        self.stdout.write(f"destinatários:  {recipients}")
+        self.stdout.write(f"antes:          {before * 1e6:.1f} µs de CPU por mensagem")
+        self.stdout.write(f"depois ({codec_name}): {after * 1e6:.1f} µs de CPU por mensagem")
+        self.stdout.write(f"ganho:          {before / after:.1f}x")
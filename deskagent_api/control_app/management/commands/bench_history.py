@@ -0,0 +1,48 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from control_app.history import HistoryStore
+
+
+class Command(BaseCommand):
+    help = "Mede memória e custo de gravação/consulta do histórico de telemetria"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agents", type=int, default=10_000)
+        parser.add_argument("--samples", type=int, default=100, help="amostras por agent")
+
+    def handle(self, *args, agents, samples, **options):
+        tracemalloc.start()
+        store = HistoryStore(max_agents=agents)
+        now = time.time()
+
+        started = time.perf_counter()
+        for n in range(samples):
+            timestamp = now + n * 3
+            for i in range(agents):
+                store.record(f"agent-{i}", {
+                    "cpu_percent": random.random() * 100,
+                    "memory": 8e9,
+                    "disk_usage": 2e11,
+                    "timestamp": timestamp,
+                })
+        record_time = time.perf_counter() - started
+
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        queries = min(agents, 1000)
+        for i in range(queries):
+            store.query(f"agent-{i}", now, now + samples * 3)
+        query_time = time.perf_counter() - started
+
+        writes = agents * samples
+        self.stdout.write(f"agents:            {len(store)}")
+        self.stdout.write(f"buffers:           {store.nbytes() / agents / 1024:.1f} KiB/agent")
+        self.stdout.write(f"memória total:     {allocated / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"gravação:          {record_time / writes * 1e6:.2f} µs/amostra")
+        self.stdout.write(f"consulta:          {query_time / queries * 1e3:.3f} ms/consulta")
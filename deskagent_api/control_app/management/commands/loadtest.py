@@ -0,0 +1,401 @@
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.request import urlopen
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from control_app import audit, ratelimit
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def ratio(value, base):
+    return round(value / base, 2) if base else None
+
+
+def summary_ms(values):
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3) if values else None,
+        "p99": round(percentile(values, 99) * 1000, 3) if values else None,
+        "max": round(max(values) * 1000, 3) if values else None,
+        "samples": len(values),
+    }
+
+
+class LoopLagMonitor:
+    """Mede o atraso do event loop acordando a cada `interval` segundos."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class SocketClient:
+    """Interface do WebsocketCommunicator sobre um WebSocket de verdade."""
+
+    def __init__(self, ws):
+        self.ws = ws
+
+    async def send_to(self, text_data):
+        await self.ws.send(text_data)
+
+    async def receive_from(self, timeout=1):
+        return await asyncio.wait_for(self.ws.recv(), timeout)
+
+    async def disconnect(self):
+        await self.ws.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe N agents e M apps simulados contra o roteamento real do ASGI "
+        "(in-process, WebsocketCommunicator) e mede latência e vazão. Com "
+        "--workers, roda contra o serve.py com o layer e o store no Redis, "
+        "uma vez para cada quantidade de workers, e compara a vazão"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agents", type=int, default=50)
+        parser.add_argument("--apps", type=int, default=10)
+        parser.add_argument("--commands", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--duration", type=float, default=10.0, help="segundos de pc_info")
+        parser.add_argument("--pc-info-interval", type=float, default=1.0)
+        parser.add_argument("--output", default=None, help="arquivo JSON de resultado")
+        parser.add_argument("--compare", default=None, help="resultado anterior para comparar")
+        parser.add_argument(
+            "--workers", default=None,
+            help="quantidades de workers do serve.py a comparar, ex.: 1,4"
+        )
+        parser.add_argument("--redis", default=settings.REDIS_URLS[0], help="Redis do layer e do store")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        self.url = None
+        if options["workers"]:
+            results = self.run_workers(options)
+        else:
+            # Sem rate limit nem audit, como no serve(): o objetivo é medir
+            # o caminho do comando, sem gravar o tráfego de teste no banco
+            with override_settings(RATE_LIMITS={}, AUDIT_ENABLED=False):
+                ratelimit._limiter = None
+                audit._writer = None
+                try:
+                    results = asyncio.run(self.run(options))
+                finally:
+                    ratelimit._limiter = None
+                    audit._writer = None
+
+        output = options["output"] or (
+            Path(settings.BASE_DIR) / "benchmarks" / "results"
+            / time.strftime("loadtest-%Y%m%d-%H%M%S.json")
+        )
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+
+        self.stdout.write(json.dumps(results, indent=2))
+        self.stdout.write(f"resultado salvo em {output}")
+
+        if options["compare"]:
+            previous = json.loads(Path(options["compare"]).read_text())
+            if "runs" not in results:
+                self.compare(previous, results)
+            for workers, run in results.get("runs", {}).items():
+                if workers in previous.get("runs", {}):
+                    self.stdout.write(f"{workers} worker(s):")
+                    self.compare(previous["runs"][workers], run)
+
+    def run_workers(self, options):
+        counts = [int(count) for count in options["workers"].split(",")]
+        self.url = f"ws://127.0.0.1:{options['port']}"
+        runs = {}
+        for workers in counts:
+            self.stdout.write(f"rodando com {workers} worker(s)...")
+            with self.serve(workers, options["port"], options["redis"]):
+                self.wait_ready(options["port"])
+                runs[str(workers)] = asyncio.run(self.run(options))
+
+        # Vazão de cada rodada em relação à primeira
+        base = runs[str(counts[0])]
+        scaling = {
+            workers: {
+                "commands_per_second": ratio(run["commands_per_second"], base["commands_per_second"]),
+                "pc_info_delivered_per_second": ratio(
+                    run["pc_info"]["delivered_per_second"], base["pc_info"]["delivered_per_second"]
+                ),
+            }
+            for workers, run in runs.items()
+        }
+        return {
+            "timestamp": time.time(),
+            "mode": "workers",
+            "redis": options["redis"],
+            "runs": runs,
+            "scaling": scaling,
+        }
+
+    @contextmanager
+    def serve(self, workers, port, redis_url):
+        env = {
+            **os.environ,
+            "CHANNEL_LAYER": "redis",
+            "STATE_BACKEND": "redis",
+            "REDIS_URLS": redis_url,
+            "RATE_LIMITS_ENABLED": "False",
+            "AUDIT_ENABLED": "False",
+        }
+        proc = subprocess.Popen(
+            [sys.executable, "serve.py", "--workers", str(workers),
+             "--host", "127.0.0.1", "--port", str(port)],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            yield proc
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+
+    def wait_ready(self, port, timeout=30):
+        # HTTP e não WebSocket: não cria consumer só para testar a porta
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urlopen(f"http://127.0.0.1:{port}/metrics/", timeout=1):
+                    return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("serve.py não respondeu a tempo")
+                time.sleep(0.2)
+
+    async def connect(self, path, hello):
+        if self.url is not None:
+            import websockets
+
+            client = SocketClient(await websockets.connect(self.url + path, max_size=None))
+            await client.send_to(text_data=json.dumps(hello))
+            return client
+
+        from deskagent_api.asgi import application
+
+        communicator = WebsocketCommunicator(application, path)
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError(f"falha ao conectar em {path}")
+        await communicator.send_to(text_data=json.dumps(hello))
+        return communicator
+
+    async def run(self, options):
+        n_agents = options["agents"]
+        n_apps = options["apps"]
+        monitor = LoopLagMonitor()
+        monitor.start()
+
+        tracemalloc.start()
+        memory_before, _ = tracemalloc.get_traced_memory()
+
+        agent_ids = [f"bench-agent-{i}" for i in range(n_agents)]
+        agents_control = [
+            await self.connect("/ws/control/", {
+                "type": "hello", "role": "agent",
+                "token": settings.AGENT_TOKEN, "agent_id": agent_id
+            })
+            for agent_id in agent_ids
+        ]
+        agents_info = [
+            await self.connect("/ws/pc_info/", {
+                "type": "hello", "role": "agent",
+                "token": settings.AGENT_TOKEN, "agent_id": agent_id
+            })
+            for agent_id in agent_ids
+        ]
+        apps_control = [
+            await self.connect("/ws/control/", {"type": "hello", "role": "app", "user_id": f"bench-app-{i}"})
+            for i in range(n_apps)
+        ]
+        apps_info = [
+            await self.connect("/ws/pc_info/", {"type": "hello", "role": "app"})
+            for _ in range(n_apps)
+        ]
+        communicators = agents_control + agents_info + apps_control + apps_info
+
+        memory_after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory_per_connection = (memory_after - memory_before) / len(communicators)
+
+        pending = {}
+        received_pc_info = [0]
+
+        async def agent_loop(communicator):
+            while True:
+                data = json.loads(await communicator.receive_from(timeout=3600))
+                if data.get("type") == "command":
+                    await communicator.send_to(text_data=json.dumps({
+                        "type": "feedback",
+                        "role": "agent",
+                        "status": "success",
+                        "phase": "finished",
+                        "request_id": data.get("request_id"),
+                        "message": "ok"
+                    }))
+
+        async def app_control_loop(communicator):
+            while True:
+                data = json.loads(await communicator.receive_from(timeout=3600))
+                future = pending.get(data.get("request_id"))
+                if data.get("type") == "feedback" and future and not future.done():
+                    future.set_result(time.perf_counter())
+
+        async def app_info_loop(communicator):
+            while True:
+                data = json.loads(await communicator.receive_from(timeout=3600))
+                if data.get("type") == "pc_info":
+                    received_pc_info[0] += 1
+
+        readers = [asyncio.create_task(agent_loop(c)) for c in agents_control]
+        readers += [asyncio.create_task(app_control_loop(c)) for c in apps_control]
+        readers += [asyncio.create_task(app_info_loop(c)) for c in apps_info]
+
+        # Fase 1: round-trip de comando app -> agent -> feedback -> app
+        loop = asyncio.get_running_loop()
+        rtts = []
+        timeouts = 0
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def one_command(i):
+            nonlocal timeouts
+            async with semaphore:
+                request_id = uuid.uuid4().hex
+                future = pending[request_id] = loop.create_future()
+                started = time.perf_counter()
+                await apps_control[i % n_apps].send_to(text_data=json.dumps({
+                    "type": "command",
+                    "role": "app",
+                    "action": "ping",
+                    "agent_id": agent_ids[i % n_agents],
+                    "request_id": request_id
+                }))
+                try:
+                    finished = await asyncio.wait_for(future, 10)
+                    rtts.append(finished - started)
+                except asyncio.TimeoutError:
+                    timeouts += 1
+                finally:
+                    pending.pop(request_id, None)
+
+        commands_started = time.perf_counter()
+        await asyncio.gather(*(one_command(i) for i in range(options["commands"])))
+        commands_elapsed = time.perf_counter() - commands_started
+
+        # Fase 2: fan-out de pc_info agents -> apps
+        sent_pc_info = 0
+        duration = options["duration"]
+        interval = options["pc_info_interval"]
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            tick = time.perf_counter()
+            for agent_id, communicator in zip(agent_ids, agents_info):
+                await communicator.send_to(text_data=json.dumps({
+                    "type": "pc_info",
+                    "cpu_percent": 12.5,
+                    "memory": 8e9,
+                    "disk_usage": 2e11,
+                    "timestamp": time.time(),
+                }))
+                sent_pc_info += 1
+            await asyncio.sleep(max(0, interval - (time.perf_counter() - tick)))
+        await asyncio.sleep(1)  # deixa as filas esvaziarem
+        elapsed = time.perf_counter() - started
+
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await monitor.stop()
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        expected = sent_pc_info * n_apps
+        return {
+            "timestamp": time.time(),
+            "params": {
+                "agents": n_agents,
+                "apps": n_apps,
+                "commands": options["commands"],
+                "concurrency": options["concurrency"],
+                "duration": duration,
+                "pc_info_interval": interval,
+            },
+            "command_rtt_ms": {**summary_ms(rtts), "timeouts": timeouts},
+            "commands_per_second": round(len(rtts) / commands_elapsed, 1),
+            "pc_info": {
+                "sent": sent_pc_info,
+                "delivered": received_pc_info[0],
+                "delivered_per_second": round(received_pc_info[0] / elapsed, 1),
+                "delivery_ratio": round(received_pc_info[0] / expected, 4) if expected else None,
+            },
+            # Contra o serve.py o tracemalloc só veria o lado dos clientes
+            "memory_per_connection_kb": (
+                round(memory_per_connection / 1024, 2) if self.url is None else None
+            ),
+            "loop_lag_ms": {
+                **summary_ms(monitor.lags),
+                "mean": round(statistics.fmean(monitor.lags) * 1000, 3) if monitor.lags else None,
+            },
+        }
+
+    def compare(self, previous, current):
+        metrics = [
+            ("command_rtt_ms", "p50"),
+            ("command_rtt_ms", "p99"),
+            ("pc_info", "delivered_per_second"),
+            ("memory_per_connection_kb", None),
+            ("loop_lag_ms", "p99"),
+        ]
+        self.stdout.write("comparação com o resultado anterior:")
+        for section, key in metrics:
+            before = previous.get(section)
+            after = current.get(section)
+            if key is not None:
+                before = before.get(key) if before else None
+                after = after.get(key) if after else None
+            name = f"{section}.{key}" if key else section
+            if not before or after is None:
+                self.stdout.write(f"  {name}: {before} -> {after}")
+                continue
+            change = (after - before) / before * 100
+            self.stdout.write(f"  {name}: {before} -> {after} ({change:+.1f}%)")
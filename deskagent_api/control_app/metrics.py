@@ -0,0 +1,183 @@
+import time
+from bisect import bisect_left
+
+
+# Séries por métrica; rótulos novos além disso caem em "other"
+MAX_SERIES = 200
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Metric:
+    """Base das métricas: um dicionário de séries indexado pelos rótulos.
+
+    Tudo roda no event loop do worker (a view /metrics também é async),
+    então não há lock: registrar é uma busca no dict e uma soma.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+        _metrics.append(self)
+
+    def _key(self, values):
+        # Rótulo que não é escalar (ex.: lista vinda do cliente) não vira série
+        values = tuple(
+            value if value is None or isinstance(value, (str, int, float)) else "invalid"
+            for value in values
+        )
+        if values in self._series or len(self._series) < MAX_SERIES:
+            return values
+        return ("other",) * len(values)
+
+    def _label_text(self, values, extra=None):
+        pairs = list(zip(self.labels, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        inner = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + inner + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        key = self._key(values)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def _samples(self):
+        for values, total in self._series.items():
+            yield f"{self.name}{self._label_text(values)} {total}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *values, value):
+        self._series[self._key(values)] = value
+
+    def inc(self, *values, amount=1):
+        key = self._key(values)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, *values, amount=1):
+        self.inc(*values, amount=-amount)
+
+    def _samples(self):
+        for values, value in self._series.items():
+            yield f"{self.name}{self._label_text(values)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *values, value):
+        key = self._key(values)
+        series = self._series.get(key)
+        if series is None:
+            # [contagem por bucket (+Inf no fim), soma, total]
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *values):
+        return _Timer(self, values)
+
+    def _samples(self):
+        for values, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self._label_text(values, ("le", repr(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = self._label_text(values, ("le", "+Inf"))
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{self._label_text(values)} {total}"
+            yield f"{self.name}_count{self._label_text(values)} {count}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "values", "started")
+
+    def __init__(self, histogram, values):
+        self.histogram = histogram
+        self.values = values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(*self.values, value=time.perf_counter() - self.started)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_metrics = []
+_collectors = []
+
+
+def register_collector(collect):
+    """`collect()` devolve {nome: valor}; exposto como gauge na coleta."""
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, value in collect().items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+messages_received = Counter(
+    "deskagent_messages_received_total",
+    "Mensagens recebidas dos clientes por consumer e tipo",
+    ("consumer", "type"),
+)
+group_send_seconds = Histogram(
+    "deskagent_group_send_seconds",
+    "Latência do group_send por grupo",
+    ("group",),
+)
+group_members = Gauge(
+    "deskagent_group_members",
+    "Membros de cada grupo neste worker",
+    ("group",),
+)
+rate_limited = Counter(
+    "deskagent_rate_limited_total",
+    "Comandos recusados pelo rate limit, por regra",
+    ("rule",),
+)
+handshake_failures = Counter(
+    "deskagent_handshake_failures_total",
+    "Falhas de handshake por motivo",
+    ("consumer", "reason"),
+)
+telemetry_modes = Gauge(
+    "deskagent_telemetry_agents",
+    "Agents deste worker em cada modo de telemetria",
+    ("mode",),
+)
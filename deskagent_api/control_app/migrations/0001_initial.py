@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditRecord",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("command", "Comando"), ("feedback", "Feedback"), ("log", "Log")], max_length=16)),
+                ("agent_id", models.CharField(max_length=255)),
+                ("request_id", models.CharField(blank=True, default="", max_length=300)),
+                ("action", models.CharField(blank=True, default="", max_length=64)),
+                ("status", models.CharField(blank=True, default="", max_length=32)),
+                ("message", models.TextField(blank=True, default="")),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["agent_id", "created_at"], name="audit_agent_time_idx"),
+                    models.Index(fields=["created_at"], name="audit_time_idx"),
+                    models.Index(fields=["request_id"], name="audit_request_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class AuditRecord(models.Model):
+    """Comando, feedback ou log que passou pelo ControlConsumer."""
+
+    KIND_CHOICES = [
+        ("command", "Comando"),
+        ("feedback", "Feedback"),
+        ("log", "Log"),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    agent_id = models.CharField(max_length=255)
+    request_id = models.CharField(max_length=300, blank=True, default="")
+    action = models.CharField(max_length=64, blank=True, default="")
+    # status do feedback ou nível do log
+    status = models.CharField(max_length=32, blank=True, default="")
+    message = models.TextField(blank=True, default="")
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["agent_id", "created_at"], name="audit_agent_time_idx"),
+            models.Index(fields=["created_at"], name="audit_time_idx"),
+            models.Index(fields=["request_id"], name="audit_request_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.agent_id} {self.created_at:%Y-%m-%d %H:%M:%S}"
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import weakref
+from collections import deque
+
+
+LATEST = "latest"
+DROP_OLDEST = "drop_oldest"
+NEVER = "never"
+
+# Contadores globais do processo (expostos em outbox_stats)
+counters = {
+    "enqueued": 0,
+    "sent": 0,
+    "coalesced": 0,
+    "dropped": 0,
+    "slow_disconnects": 0,
+}
+_outboxes = weakref.WeakSet()
+
+
+class Outbox:
+    """Fila de saída limitada de uma conexão, com política por tipo.
+
+    latest       mantém só a mensagem mais recente por (tipo, agent)
+    drop_oldest  descarta a mais antiga descartável quando a fila enche
+    never        nunca descarta, mesmo acima do limite
+
+    Se a fila chega no limite (descartando ou passando dele) e não
+    esvazia em `slow_timeout` segundos, a conexão é derrubada: descartar
+    para sempre não é servir o cliente.
+
+    O send() do Daphne não espera o socket (o quadro vai para o buffer
+    do Twisted), então a fila só enche de verdade com `use_acks`: o
+    cliente confirma quantos quadros já processou e no máximo
+    `ack_window` ficam sem confirmação. Clientes sem ack não têm sinal
+    de lentidão.
+    """
+
+    def __init__(self, sender, on_slow, max_depth=100, policies=None,
+                 default_policy=DROP_OLDEST, slow_timeout=10):
+        self.sender = sender
+        self.on_slow = on_slow
+        self.max_depth = max_depth
+        self.policies = policies or {}
+        self.default_policy = default_policy
+        self.slow_timeout = slow_timeout
+        self._queue = deque()
+        self._latest = {}
+        self._ready = asyncio.Event()
+        self._over_since = None
+        self._task = None
+        self.ack_window = None
+        self._sent = 0
+        self._acked = 0
+        self._acks = asyncio.Event()
+        self.dropped = 0
+        _outboxes.add(self)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def use_acks(self, window):
+        self.ack_window = window
+        self._acks.set()
+
+    def ack(self, received):
+        """`received`: total de quadros que o cliente processou desde que conectou."""
+        self._acked = max(self._acked, min(received, self._sent))
+        self._acks.set()
+
+    def put(self, message_type, frame, key=None):
+        counters["enqueued"] += 1
+        policy = self.policies.get(message_type, self.default_policy)
+
+        coalesce_key = None
+        if policy == LATEST:
+            coalesce_key = (message_type, key)
+            entry = self._latest.get(coalesce_key)
+            if entry is not None:
+                # Substitui no lugar: a versão antiga nunca chega a sair
+                entry[2] = frame
+                counters["coalesced"] += 1
+                return
+
+        if len(self._queue) >= self.max_depth:
+            self._check_slow()
+            if not self._drop_one() and policy != NEVER:
+                self._count_drop()
+                return
+
+        entry = [policy, coalesce_key, frame]
+        if coalesce_key is not None:
+            self._latest[coalesce_key] = entry
+        self._queue.append(entry)
+        self._ready.set()
+
+    def _count_drop(self):
+        self.dropped += 1
+        counters["dropped"] += 1
+
+    def _drop_one(self):
+        for i, entry in enumerate(self._queue):
+            if entry[0] != NEVER:
+                del self._queue[i]
+                if entry[1] is not None:
+                    self._latest.pop(entry[1], None)
+                self._count_drop()
+                return True
+        return False
+
+    def _check_slow(self):
+        # Chamado com a fila no limite; o relógio só zera quando ela esvazia
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since >= self.slow_timeout:
+            counters["slow_disconnects"] += 1
+            self._over_since = None
+            asyncio.get_running_loop().create_task(self.on_slow())
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                if self.ack_window is not None and self._sent - self._acked >= self.ack_window:
+                    # Janela cheia: espera o ack enquanto a fila aplica as políticas
+                    self._acks.clear()
+                    await self._acks.wait()
+                    continue
+                _, key, frame = self._queue.popleft()
+                if key is not None:
+                    self._latest.pop(key, None)
+                await self.sender(frame)
+                self._sent += 1
+                counters["sent"] += 1
+            self._over_since = None
+            self._ready.clear()
+
+
+def outbox_stats():
+    depths = [len(outbox) for outbox in _outboxes]
+    return {
+        **counters,
+        "connections": len(depths),
+        "queued": sum(depths),
+        "max_depth": max(depths, default=0),
+    }
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .codec import broadcast_event
+from .metrics import group_send_seconds
+from .state import get_store
+
+
+PRESENCE_KEY = "presence"
+
+logger = logging.getLogger(__name__)
+
+
+def presence_cutoff(now):
+    """Entradas gravadas antes disto são de um worker que caiu."""
+    return now - settings.PRESENCE_TIMEOUT_SECONDS - settings.PRESENCE_KEEPALIVE_SECONDS
+
+
+async def load_presence(now=None):
+    """Presença gravada por todos os workers, sem as entradas vencidas.
+
+    Cada worker regrava os seus agents (com `updated_at`) a cada
+    PRESENCE_KEEPALIVE_SECONDS. Entrada sem regravação há mais de
+    PRESENCE_TIMEOUT_SECONDS + PRESENCE_KEEPALIVE_SECONDS é de um worker
+    que caiu sem marcar os agents offline: sai da leitura e do store.
+    """
+    now = time.time() if now is None else now
+    store = get_store()
+    entries = await store.hgetall(PRESENCE_KEY)
+
+    cutoff = presence_cutoff(now)
+    stale = [agent_id for agent_id, entry in entries.items() if entry.get("updated_at", 0) < cutoff]
+    await store.hdel(PRESENCE_KEY, *stale)
+    for agent_id in stale:
+        del entries[agent_id]
+    return entries
+
+
+class PresenceTable:
+    """Absorve os heartbeats dos agents deste worker.
+
+    Em vez de um group_send por heartbeat, um único tick periódico envia
+    aos apps só os agents que mudaram de estado desde o último tick, e de
+    tempos em tempos um "status" curto que mantém os apps antigos online.
+
+    Agents sem sinal há PRESENCE_TIMEOUT_SECONDS caem para offline. O
+    prazo fica numa roda de tempo (um slot por tick): o heartbeat só
+    atualiza last_seen, e o tick olha apenas os slots que venceram. Quem
+    ainda está vivo volta para o slot do novo prazo, então cada agent é
+    examinado no máximo uma vez por timeout, com 10k+ agents ou não.
+
+    Agents com heartbeat "ping" dependem do ping/pong do WebSocket: o
+    Daphne fecha a conexão sem pong e o disconnect marca offline.
+    """
+
+    def __init__(self, app_group):
+        self.app_group = app_group
+        self._agents = {}
+        self._connections = {}
+        self._dirty = set()
+        self._task = None
+        self._last_keepalive = 0
+        self._any_online = False
+        # Roda de tempo: slot -> agents com prazo nele
+        self._wheel = {}
+        self._slots = {}
+        self._swept = None
+        self._ping = set()
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def connected(self, agent_id, channel_name, heartbeat="app"):
+        self._connections.setdefault(agent_id, set()).add(channel_name)
+        if heartbeat == "ping":
+            self._ping.add(agent_id)
+        self.seen(agent_id)
+
+    def seen(self, agent_id):
+        entry = self._agents.get(agent_id)
+        now = time.time()
+        if entry is None or not entry["online"]:
+            self._agents[agent_id] = {"online": True, "last_seen": now}
+            self._dirty.add(agent_id)
+            self._schedule(agent_id, now + settings.PRESENCE_TIMEOUT_SECONDS)
+        else:
+            entry["last_seen"] = now
+
+    def _schedule(self, agent_id, deadline):
+        slot = math.ceil(deadline / settings.PRESENCE_TICK_SECONDS)
+        self._slots[agent_id] = slot
+        self._wheel.setdefault(slot, set()).add(agent_id)
+
+    def sweep(self, now):
+        """Marca offline quem passou do prazo; devolve os agents expirados."""
+        current = math.floor(now / settings.PRESENCE_TICK_SECONDS)
+        if self._swept is None:
+            self._swept = min(self._wheel, default=current) - 1
+
+        expired = []
+        timeout = settings.PRESENCE_TIMEOUT_SECONDS
+        for slot in range(self._swept + 1, current + 1):
+            for agent_id in self._wheel.pop(slot, ()):
+                if self._slots.get(agent_id) != slot:
+                    continue  # reagendado em outro slot
+                del self._slots[agent_id]
+
+                entry = self._agents.get(agent_id)
+                if entry is None or not entry["online"] or agent_id in self._ping:
+                    continue
+
+                deadline = entry["last_seen"] + timeout
+                if deadline > now:
+                    self._schedule(agent_id, deadline)
+                    continue
+
+                entry["online"] = False
+                self._dirty.add(agent_id)
+                expired.append(agent_id)
+        self._swept = current
+        return expired
+
+    def disconnected(self, agent_id, channel_name):
+        # Agent com mais de uma conexão (controle + telemetria) só cai na última
+        channels = self._connections.get(agent_id)
+        if channels is None:
+            return
+        channels.discard(channel_name)
+        if channels:
+            return
+
+        del self._connections[agent_id]
+        self._ping.discard(agent_id)
+        entry = self._agents.get(agent_id)
+        if entry is not None and entry["online"]:
+            entry["online"] = False
+            self._dirty.add(agent_id)
+
+    async def snapshot(self):
+        return await load_presence()
+
+    async def flush(self):
+        now = time.time()
+        layer = get_channel_layer()
+        store = get_store()
+
+        # Conexões de agents expirados estão meio abertas: fecha para reconectarem
+        for agent_id in self.sweep(now):
+            for channel_name in self._connections.get(agent_id, ()):
+                await layer.send(channel_name, {"type": "liveness_expired"})
+
+        if self._dirty:
+            changed = {agent_id: dict(self._agents[agent_id]) for agent_id in self._dirty}
+            self._dirty.clear()
+
+            offline = [agent_id for agent_id, entry in changed.items() if not entry["online"]]
+            for agent_id in offline:
+                del self._agents[agent_id]
+
+            await store.hset_many(PRESENCE_KEY, {
+                agent_id: {**entry, "updated_at": now}
+                for agent_id, entry in changed.items() if entry["online"]
+            })
+            await store.hdel(PRESENCE_KEY, *offline)
+
+            with group_send_seconds.time(self.app_group):
+                await layer.group_send(self.app_group, broadcast_event({
+                    "type": "presence",
+                    "agents": changed,
+                    "timestamp": now
+                }))
+
+        # O último agent deste worker caiu: avisa os apps antigos na hora,
+        # mas só se nenhum outro worker ainda tem agents online
+        if self._any_online and not self._agents and not await load_presence(now):
+            with group_send_seconds.time(self.app_group):
+                await layer.group_send(self.app_group, broadcast_event({
+                    "type": "status",
+                    "online": False,
+                    "timestamp": now
+                }))
+        self._any_online = bool(self._agents)
+
+        if self._agents and now - self._last_keepalive >= settings.PRESENCE_KEEPALIVE_SECONDS:
+            self._last_keepalive = now
+            await store.hset_many(PRESENCE_KEY, {
+                agent_id: {**entry, "updated_at": now} for agent_id, entry in self._agents.items()
+            })
+            with group_send_seconds.time(self.app_group):
+                await layer.group_send(self.app_group, broadcast_event({
+                    "type": "status",
+                    "online": True,
+                    "timestamp": now
+                }))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_TICK_SECONDS)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Erro ao enviar presença")
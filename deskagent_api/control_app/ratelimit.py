@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .state import KEY_PREFIX, RedisStore, get_store
+
+
+# Token bucket atômico no Redis: KEYS[1]=bucket, ARGV=rate, burst, now, ttl
+TOKEN_BUCKET_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+return allowed
+"""
+
+
+class MemoryBuckets:
+    """Buckets locais com expiração por inatividade e limite de entradas.
+
+    O OrderedDict fica ordenado pelo último uso, então a expiração só
+    olha o começo da fila e cada verificação continua O(1) amortizado.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+
+    def _evict(self, now):
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < self.ttl and len(self._buckets) <= self.max_entries:
+                break
+            del self._buckets[key]
+
+    async def take(self, key, rate, burst):
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        self._buckets[key] = (tokens, now)
+        self._evict(now)
+        return allowed
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBuckets:
+    """Buckets compartilhados entre workers; o Redis expira as chaves."""
+
+    def __init__(self, client, ttl):
+        self.ttl = ttl
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key, rate, burst):
+        allowed = await self._take(
+            keys=[f"{KEY_PREFIX}ratelimit:{key}"],
+            args=[rate, burst, time.time(), int(self.ttl * 1000)]
+        )
+        return bool(allowed)
+
+
+class RateLimiter:
+    """Token buckets por regra (app, agent+ação, ...) definidos em RATE_LIMITS."""
+
+    def __init__(self, rules, backend):
+        self.rules = rules
+        self.backend = backend
+
+    async def allow(self, rule, *key_parts):
+        limit = self.rules.get(rule)
+        if limit is None:
+            return True
+
+        key = ":".join([rule, *map(str, key_parts)])
+        return await self.backend.take(key, limit["rate"], limit["burst"])
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        ttl = settings.RATE_LIMIT_TTL_SECONDS
+        store = get_store()
+        if isinstance(store, RedisStore):
+            backend = RedisBuckets(store.client, ttl)
+        else:
+            backend = MemoryBuckets(ttl, settings.RATE_LIMIT_MAX_ENTRIES)
+        _limiter = RateLimiter(settings.RATE_LIMITS, backend)
+    return _limiter
@@ -0,0 +1,90 @@
+import time
+
+from .presence import PRESENCE_KEY, load_presence, presence_cutoff
+from .state import get_store
+
+
+class AgentRegistry:
+    """Mapa agent_id -> channel_name, preenchido no handshake do agent.
+
+    Fica no store compartilhado, então qualquer worker entrega comandos
+    para agents conectados em outro worker.
+
+    Um worker que cai não chama unregister. Por isso uma entrada só vale
+    enquanto o agent está na presença compartilhada, ou logo após o
+    registro, antes do primeiro tick de presença. As que não valem mais
+    são apagadas na leitura.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.meta_key = f"{key}_meta"
+
+    async def register(self, agent_id, channel_name, **meta):
+        store = get_store()
+        await store.hset(self.key, agent_id, channel_name)
+        await store.hset(self.meta_key, agent_id, {
+            "connected_at": time.time(),
+            **meta
+        })
+
+    async def unregister(self, agent_id, channel_name):
+        # Só remove se o registro ainda for desta conexão (reconexões rápidas)
+        store = get_store()
+        if await store.hdel_if(self.key, agent_id, channel_name):
+            await store.hdel(self.meta_key, agent_id)
+
+    def _alive(self, meta, presence, cutoff):
+        if meta and meta.get("connected_at", 0) >= cutoff:
+            return True
+        return presence is not None and presence.get("updated_at", 0) >= cutoff
+
+    async def get_channel(self, agent_id):
+        store = get_store()
+        channel_name = await store.hget(self.key, agent_id)
+        if channel_name is None:
+            return None
+
+        meta = await store.hget(self.meta_key, agent_id)
+        presence = await store.hget(PRESENCE_KEY, agent_id)
+        if self._alive(meta, presence, presence_cutoff(time.time())):
+            return channel_name
+        await self.unregister(agent_id, channel_name)
+        return None
+
+    async def get_meta(self, agent_id):
+        return await get_store().hget(self.meta_key, agent_id)
+
+    async def live_metas(self):
+        """Meta dos agents registrados que ainda estão vivos."""
+        store = get_store()
+        channels = await store.hgetall(self.key)
+        metas = await store.hgetall(self.meta_key)
+        online = await load_presence()
+        cutoff = presence_cutoff(time.time())
+
+        live = {}
+        for agent_id, channel_name in channels.items():
+            meta = metas.get(agent_id) or {}
+            if self._alive(meta, online.get(agent_id), cutoff):
+                live[agent_id] = meta
+            else:
+                await self.unregister(agent_id, channel_name)
+        return live
+
+    async def agent_ids(self):
+        return list(await self.live_metas())
+
+    async def find_by_tags(self, tags):
+        """Agents conectados que têm todas as tags pedidas."""
+        wanted = set(tags)
+        metas = await self.live_metas()
+        return [
+            agent_id for agent_id, meta in metas.items()
+            if wanted <= set(meta.get("tags") or ())
+        ]
+
+
+registry = AgentRegistry("agents")
+# Conexões de telemetria (ws/pc_info/) de cada agent
+telemetry_registry = AgentRegistry("telemetry_agents")
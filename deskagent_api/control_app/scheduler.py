@@ -0,0 +1,268 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .codec import broadcast_event
+from .commands import dispatch_command
+from .state import get_store
+
+
+SCHEDULES_KEY = "schedules"
+# job_id -> {"worker", "until"}: só o worker dono da claim dispara o job
+CLAIMS_KEY = "schedule_claims"
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Comandos agendados (uma vez ou recorrentes) deste worker.
+
+    Um heap de (fire_at, seq, job_id) e uma única task que dorme até o
+    próximo disparo; não existe uma task por job. Cancelar só remove o
+    job do dicionário, e a entrada velha do heap é ignorada quando sai
+    (o heap é reconstruído se acumular entradas mortas demais).
+
+    Os jobs também ficam no store compartilhado, então qualquer worker
+    lista e cancela; o disparo confere se o job ainda existe lá.
+
+    Cada job tem uma claim com prazo no store (compare-and-set), renovada
+    pelo worker dono em `sync`. O sync roda ao iniciar e periodicamente:
+    jobs gravados antes de um restart, ou de um worker que caiu, voltam
+    para o heap de quem conseguir a claim, e só esse worker os dispara.
+    """
+
+    def __init__(self, app_group):
+        self.app_group = app_group
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._last_sync = 0
+        # Identifica este worker nas claims
+        self.worker_id = uuid.uuid4().hex
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def build_job(self, data, owner):
+        """Valida um schedule_command; devolve (job, erro)."""
+        command = data.get("command")
+        if not isinstance(command, dict) or not command.get("action"):
+            return None, "Informe o comando (command.action)"
+
+        agent_ids = command.get("agent_ids")
+        if agent_ids is not None and not isinstance(agent_ids, list):
+            return None, "agent_ids deve ser uma lista"
+        agent_ids = agent_ids or [command.get("agent_id")]
+        if not all(isinstance(agent_id, str) and agent_id for agent_id in agent_ids):
+            return None, "Informe o agent_id ou agent_ids do comando"
+
+        now = time.time()
+        try:
+            fire_at = float(data["at"]) if data.get("at") is not None else now + float(data.get("delay", 0))
+            interval = float(data["interval"]) if data.get("interval") is not None else None
+        except (TypeError, ValueError):
+            return None, "Horário inválido"
+        # NaN no topo do heap travaria todos os disparos seguintes
+        if not math.isfinite(fire_at):
+            return None, "Horário inválido"
+        if interval is not None and (not math.isfinite(interval) or interval <= 0):
+            return None, "Intervalo inválido"
+
+        if interval is not None and interval < settings.SCHEDULER_MIN_INTERVAL:
+            return None, f"Intervalo mínimo de {settings.SCHEDULER_MIN_INTERVAL} segundos"
+
+        count = data.get("count")
+        if count is not None and (not isinstance(count, int) or count <= 0):
+            return None, "Quantidade de execuções inválida"
+
+        if len(self._jobs) >= settings.SCHEDULER_MAX_JOBS:
+            return None, "Limite de agendamentos atingido"
+
+        command = {k: v for k, v in command.items() if k not in ("agent_id", "agent_ids", "type")}
+        return {
+            "job_id": uuid.uuid4().hex,
+            "owner": owner,
+            "command": command,
+            "agent_ids": agent_ids,
+            "fire_at": max(fire_at, now),
+            "interval": interval,
+            "remaining": count if interval is not None else 1,
+            "runs": 0,
+            "created_at": now
+        }, None
+
+    async def add(self, job):
+        # A claim vem antes do job: outro worker não o adota no meio
+        await self._claim(job["job_id"], None, time.time())
+        await get_store().hset(SCHEDULES_KEY, job["job_id"], job)
+        self._push(job)
+
+    async def _claim(self, job_id, current, now):
+        """Pega ou renova a claim do job; False se ela é de outro worker."""
+        if current is not None and current["worker"] != self.worker_id and current["until"] > now:
+            return False
+        return await get_store().hset_if(CLAIMS_KEY, job_id, current, {
+            "worker": self.worker_id,
+            "until": now + settings.SCHEDULER_CLAIM_SECONDS
+        })
+
+    async def _release(self, job_id):
+        self._jobs.pop(job_id, None)
+        await get_store().hdel(CLAIMS_KEY, job_id)
+
+    async def sync(self, now=None):
+        """Renova as claims deste worker e adota os jobs sem dono."""
+        now = time.time() if now is None else now
+        self._last_sync = now
+        store = get_store()
+        jobs = await store.hgetall(SCHEDULES_KEY)
+        claims = await store.hgetall(CLAIMS_KEY)
+
+        for job_id in list(self._jobs):
+            if job_id not in jobs:
+                # Cancelado por outro worker
+                await self._release(job_id)
+            elif not await self._claim(job_id, claims.get(job_id), now):
+                self._jobs.pop(job_id, None)
+
+        for job_id, job in jobs.items():
+            if job_id not in self._jobs and await self._claim(job_id, claims.get(job_id), now):
+                self._push(job)
+
+        # Claims de jobs que já não existem
+        await store.hdel(CLAIMS_KEY, *(job_id for job_id in claims if job_id not in jobs))
+        self._compact()
+
+    def _push(self, job):
+        self._jobs[job["job_id"]] = job
+        if not self._heap or job["fire_at"] < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (job["fire_at"], next(self._seq), job["job_id"]))
+
+    async def cancel(self, job_id):
+        self._jobs.pop(job_id, None)
+        self._compact()
+        store = get_store()
+        if await store.hget(SCHEDULES_KEY, job_id) is None:
+            return False
+        await store.hdel(SCHEDULES_KEY, job_id)
+        await store.hdel(CLAIMS_KEY, job_id)
+        return True
+
+    async def list(self, owner=None):
+        jobs = (await get_store().hgetall(SCHEDULES_KEY)).values()
+        if owner is not None:
+            jobs = [job for job in jobs if job.get("owner") == owner]
+        return sorted(jobs, key=lambda job: job["fire_at"])
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+
+    def _is_current(self, entry):
+        job = self._jobs.get(entry[2])
+        return job is not None and job["fire_at"] == entry[0]
+
+    async def fire_due(self):
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_current(entry):
+                continue
+            job = self._jobs[entry[2]]
+            try:
+                await self._fire(job, now)
+            except Exception:
+                logger.exception("Erro ao disparar agendamento", extra={"job_id": job["job_id"]})
+
+    async def _fire(self, job, now):
+        store = get_store()
+        job_id = job["job_id"]
+        if await store.hget(SCHEDULES_KEY, job_id) is None:
+            # Cancelado por outro worker
+            await self._release(job_id)
+            return
+        if not await self._claim(job_id, await store.hget(CLAIMS_KEY, job_id), now):
+            # Outro worker assumiu o job (este ficou sem renovar a claim)
+            self._jobs.pop(job_id, None)
+            return
+
+        job["runs"] += 1
+        request_id = f"{job_id}:{job['runs']}"
+        layer = get_channel_layer()
+        await layer.group_send(self.app_group, broadcast_event({
+            "type": "schedule",
+            "event": "fired",
+            "job_id": job_id,
+            "request_id": request_id,
+            "timestamp": now
+        }))
+
+        for agent_id in job["agent_ids"]:
+            error = await dispatch_command({
+                **job["command"],
+                "type": "command",
+                "agent_id": agent_id,
+                "request_id": request_id,
+                "job_id": job_id
+            })
+            if error:
+                await layer.group_send(self.app_group, broadcast_event({
+                    "type": "feedback",
+                    "status": "error",
+                    "message": error,
+                    "agent_id": agent_id,
+                    "request_id": request_id,
+                    "job_id": job_id
+                }))
+
+        if job["remaining"] is not None:
+            job["remaining"] -= 1
+        if job["interval"] is None or job["remaining"] == 0:
+            await store.hdel(SCHEDULES_KEY, job_id)
+            await self._release(job_id)
+            return
+
+        # Recorrente: pula disparos perdidos em vez de acumular
+        fire_at = job["fire_at"]
+        while fire_at <= now:
+            fire_at += job["interval"]
+        job["fire_at"] = fire_at
+        await store.hset(SCHEDULES_KEY, job_id, job)
+        heapq.heappush(self._heap, (fire_at, next(self._seq), job_id))
+
+    async def _run(self):
+        # Evento do loop atual (a task pode ser recriada em outro loop)
+        self._wakeup = asyncio.Event()
+        sync_every = settings.SCHEDULER_CLAIM_SECONDS / 3
+        while True:
+            if time.time() - self._last_sync >= sync_every:
+                try:
+                    await self.sync()
+                except Exception:
+                    logger.exception("Erro ao sincronizar agendamentos")
+
+            self._wakeup.clear()
+            timeout = sync_every - (time.time() - self._last_sync)
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - time.time())
+            timeout = max(0, timeout)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            await self.fire_due()
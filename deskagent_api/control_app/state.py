@@ -0,0 +1,154 @@
+import json
+import time
+
+from django.conf import settings
+
+
+KEY_PREFIX = "deskagent:"
+
+# Remove o campo somente se o valor ainda for o esperado (compare-and-delete)
+HDEL_IF_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Grava o campo somente se o valor atual for o esperado ('' = ausente)
+HSET_IF_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if (current == false and ARGV[2] == '') or current == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class MemoryStore:
+    """Estado local do processo. Só serve para um único worker."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._expires = {}
+
+    def _hash(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._hashes.pop(key, None)
+            self._expires.pop(key, None)
+        return self._hashes.setdefault(key, {})
+
+    async def hset(self, key, field, value):
+        self._hash(key)[field] = json.dumps(value)
+
+    async def hset_many(self, key, mapping):
+        h = self._hash(key)
+        for field, value in mapping.items():
+            h[field] = json.dumps(value)
+
+    async def hget(self, key, field):
+        raw = self._hash(key).get(field)
+        return json.loads(raw) if raw is not None else None
+
+    async def hgetall(self, key):
+        return {k: json.loads(v) for k, v in self._hash(key).items()}
+
+    async def hkeys(self, key):
+        return list(self._hash(key))
+
+    async def hdel(self, key, *fields):
+        h = self._hash(key)
+        for field in fields:
+            h.pop(field, None)
+
+    async def hdel_if(self, key, field, expected):
+        h = self._hash(key)
+        if h.get(field) == json.dumps(expected):
+            del h[field]
+            return True
+        return False
+
+    async def hset_if(self, key, field, expected, value):
+        h = self._hash(key)
+        if h.get(field) != (json.dumps(expected) if expected is not None else None):
+            return False
+        h[field] = json.dumps(value)
+        return True
+
+    async def expire(self, key, seconds):
+        self._expires[key] = time.monotonic() + seconds
+
+
+class RedisStore:
+    """Estado compartilhado entre os workers do Daphne via Redis."""
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses=True)
+        # client pode ser um fakeredis.aioredis.FakeRedis em testes locais
+        self.client = client
+        self._hdel_if = client.register_script(HDEL_IF_SCRIPT)
+        self._hset_if = client.register_script(HSET_IF_SCRIPT)
+
+    async def hset(self, key, field, value):
+        await self.client.hset(KEY_PREFIX + key, field, json.dumps(value))
+
+    async def hset_many(self, key, mapping):
+        if mapping:
+            await self.client.hset(KEY_PREFIX + key, mapping={
+                field: json.dumps(value) for field, value in mapping.items()
+            })
+
+    async def hget(self, key, field):
+        raw = await self.client.hget(KEY_PREFIX + key, field)
+        return json.loads(raw) if raw is not None else None
+
+    async def hgetall(self, key):
+        raw = await self.client.hgetall(KEY_PREFIX + key)
+        return {k: json.loads(v) for k, v in raw.items()}
+
+    async def hkeys(self, key):
+        return await self.client.hkeys(KEY_PREFIX + key)
+
+    async def hdel(self, key, *fields):
+        if fields:
+            await self.client.hdel(KEY_PREFIX + key, *fields)
+
+    async def hdel_if(self, key, field, expected):
+        deleted = await self._hdel_if(
+            keys=[KEY_PREFIX + key],
+            args=[field, json.dumps(expected)]
+        )
+        return bool(deleted)
+
+    async def hset_if(self, key, field, expected, value):
+        """Compare-and-set: `expected` None exige que o campo não exista."""
+        written = await self._hset_if(
+            keys=[KEY_PREFIX + key],
+            args=[field, json.dumps(expected) if expected is not None else "", json.dumps(value)]
+        )
+        return bool(written)
+
+    async def expire(self, key, seconds):
+        await self.client.expire(KEY_PREFIX + key, int(seconds))
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if settings.STATE_BACKEND == "redis":
+            _store = RedisStore(settings.STATE_REDIS_URL)
+        else:
+            _store = MemoryStore()
+    return _store
+
+
+def set_store(store):
+    """Troca o backend em uso (ex.: RedisStore com fakeredis)."""
+    global _store
+    _store = store
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from .presence import load_presence
+from .state import get_store
+
+
+STATE_KEY = "agent_state"
+
+# Campos do feedback guardados para o replay
+FEEDBACK_FIELDS = ("request_id", "action", "status", "phase", "message", "exit_code", "timestamp")
+
+logger = logging.getLogger(__name__)
+
+
+class StateCache:
+    """Último estado conhecido dos agents deste worker, para o replay.
+
+    Guarda o último pc_info e os feedbacks recentes de cada agent. As
+    mudanças vão para o store compartilhado num tick periódico (um
+    hset_many por tick, não um por mensagem), e o app recebe tudo num
+    único `state_replay` logo depois do hello.
+
+    A memória é limitada: no máximo STATE_CACHE_MAX_AGENTS (LRU) e
+    agents que se desconectaram saem depois de STATE_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._agents = OrderedDict()
+        self._dirty = set()
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _entry(self, agent_id):
+        entry = self._agents.pop(agent_id, None)
+        if entry is None:
+            entry = {
+                "snapshot": None,
+                "feedback": deque(maxlen=settings.STATE_CACHE_FEEDBACK),
+                "gone_at": None
+            }
+        self._agents[agent_id] = entry
+        entry["updated_at"] = time.time()
+        entry["gone_at"] = None
+        self._dirty.add(agent_id)
+        return entry
+
+    def update_snapshot(self, agent_id, snapshot):
+        self._entry(agent_id)["snapshot"] = snapshot
+
+    def add_feedback(self, agent_id, feedback):
+        self._entry(agent_id)["feedback"].append({
+            "timestamp": time.time(),
+            **{key: feedback[key] for key in FEEDBACK_FIELDS if key in feedback}
+        })
+
+    def agent_gone(self, agent_id):
+        entry = self._agents.get(agent_id)
+        if entry is not None:
+            entry["gone_at"] = time.time()
+
+    def _evict(self, now):
+        evicted = {
+            agent_id for agent_id, entry in self._agents.items()
+            if entry["gone_at"] is not None and now - entry["gone_at"] >= settings.STATE_CACHE_TTL_SECONDS
+        }
+        # Acima do limite saem os menos atualizados (começo do OrderedDict)
+        excess = len(self._agents) - len(evicted) - settings.STATE_CACHE_MAX_AGENTS
+        for agent_id in self._agents:
+            if excess <= 0:
+                break
+            if agent_id not in evicted:
+                evicted.add(agent_id)
+                excess -= 1
+
+        for agent_id in evicted:
+            del self._agents[agent_id]
+            self._dirty.discard(agent_id)
+        return evicted
+
+    async def flush(self):
+        store = get_store()
+        evicted = self._evict(time.time())
+        await store.hdel(STATE_KEY, *evicted)
+
+        if self._dirty:
+            changed = {
+                agent_id: {
+                    "snapshot": self._agents[agent_id]["snapshot"],
+                    "feedback": list(self._agents[agent_id]["feedback"]),
+                    "updated_at": self._agents[agent_id]["updated_at"]
+                }
+                for agent_id in self._dirty
+            }
+            self._dirty.clear()
+            await store.hset_many(STATE_KEY, changed)
+
+    async def replay(self, fields):
+        """Mensagem state_replay com `fields` ("snapshot", "feedback") e presença."""
+        store = get_store()
+        states = await store.hgetall(STATE_KEY)
+        presence = await load_presence()
+        # O que este worker ainda não gravou é mais recente que o store
+        for agent_id in self._dirty:
+            entry = self._agents[agent_id]
+            states[agent_id] = {
+                "snapshot": entry["snapshot"],
+                "feedback": list(entry["feedback"]),
+                "updated_at": entry["updated_at"]
+            }
+
+        # Entradas de workers que caíram não são mais atualizadas
+        cutoff = time.time() - settings.STATE_CACHE_TTL_SECONDS
+        stale = {agent_id for agent_id, state in states.items() if state["updated_at"] < cutoff}
+        await store.hdel(STATE_KEY, *stale)
+
+        agents = {}
+        for agent_id in presence.keys() | states.keys():
+            if agent_id in stale:
+                continue
+            state = states.get(agent_id) or {}
+            entry = presence.get(agent_id) or {"online": False}
+            agents[agent_id] = {
+                "online": entry.get("online", False),
+                "last_seen": entry.get("last_seen", state.get("updated_at")),
+                **{field: state.get(field) for field in fields}
+            }
+
+        return {
+            "type": "state_replay",
+            "agents": agents,
+            "timestamp": time.time()
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.STATE_CACHE_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Erro ao gravar o estado dos agents")
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .metrics import telemetry_modes
+from .state import get_store
+
+
+SUBSCRIPTIONS_KEY = "telemetry_subscriptions"
+
+IDLE = "idle"
+NORMAL = "normal"
+FOCUSED = "focused"
+
+logger = logging.getLogger(__name__)
+
+
+class RateController:
+    """Ajusta a taxa de telemetria de cada agent conforme quem está olhando.
+
+    Cada app do pc_info registra no store o que acompanha: todos os
+    agents (padrão do hello), uma lista, e opcionalmente um agent em
+    foco. A cada tick, o worker conta os interessados nos agents que
+    estão conectados nele e manda `rate_control` só quando o modo muda:
+
+    idle     ninguém olhando; amostra lenta (ou só heartbeat)
+    normal   algum app acompanhando
+    focused  algum app com o agent em foco; alta resolução
+
+    Cada worker regrava as inscrições dos seus apps a cada
+    SUBSCRIPTION_REFRESH_SECONDS; as de um worker que caiu vencem e
+    deixam de segurar os agents fora do modo idle.
+    """
+
+    def __init__(self):
+        self._agents = {}
+        self._subscriptions = {}
+        self._last_refresh = 0
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def agent_connected(self, agent_id, channel_name):
+        # O agent começa cada conexão na taxa normal
+        self._agents[agent_id] = {"channel": channel_name, "mode": NORMAL}
+
+    def agent_gone(self, agent_id, channel_name):
+        entry = self._agents.get(agent_id)
+        if entry is not None and entry["channel"] == channel_name:
+            del self._agents[agent_id]
+
+    async def subscribe(self, channel_name, agent_ids=None, focus=None):
+        entry = {
+            "agents": agent_ids,
+            "focus": focus,
+            "timestamp": time.time()
+        }
+        self._subscriptions[channel_name] = entry
+        await get_store().hset(SUBSCRIPTIONS_KEY, channel_name, entry)
+
+    async def unsubscribe(self, channel_name):
+        self._subscriptions.pop(channel_name, None)
+        await get_store().hdel(SUBSCRIPTIONS_KEY, channel_name)
+
+    async def refresh(self, now):
+        if not self._subscriptions or now - self._last_refresh < settings.SUBSCRIPTION_REFRESH_SECONDS:
+            return
+        self._last_refresh = now
+        for entry in self._subscriptions.values():
+            entry["timestamp"] = now
+        await get_store().hset_many(SUBSCRIPTIONS_KEY, self._subscriptions)
+
+    async def load_subscriptions(self, now):
+        """Inscrições de todos os workers, sem as vencidas (que saem do store)."""
+        store = get_store()
+        entries = await store.hgetall(SUBSCRIPTIONS_KEY)
+        cutoff = now - 3 * settings.SUBSCRIPTION_REFRESH_SECONDS
+        stale = [channel for channel, entry in entries.items() if entry.get("timestamp", 0) < cutoff]
+        await store.hdel(SUBSCRIPTIONS_KEY, *stale)
+        return [entry for channel, entry in entries.items() if channel not in stale]
+
+    async def tick(self):
+        now = time.time()
+        await self.refresh(now)
+        if not self._agents:
+            return
+
+        subscriptions = await self.load_subscriptions(now)
+        watch_all = 0
+        watchers = Counter()
+        focused = set()
+        for subscription in subscriptions:
+            if subscription.get("agents") is None:
+                watch_all += 1
+            else:
+                watchers.update(subscription["agents"])
+            if subscription.get("focus"):
+                focused.add(subscription["focus"])
+
+        layer = get_channel_layer()
+        modes = Counter()
+        for agent_id, entry in list(self._agents.items()):
+            count = watch_all + watchers[agent_id]
+            if agent_id in focused:
+                mode = FOCUSED
+            elif count:
+                mode = NORMAL
+            else:
+                mode = IDLE
+            modes[mode] += 1
+
+            if mode == entry["mode"]:
+                continue
+            entry["mode"] = mode
+            await layer.send(entry["channel"], {
+                "type": "rate_control",
+                "message": {
+                    "type": "rate_control",
+                    "mode": mode,
+                    "interval": settings.TELEMETRY_RATES[mode],
+                    "watchers": count
+                }
+            })
+
+        for mode in (IDLE, NORMAL, FOCUSED):
+            telemetry_modes.set(mode, value=modes[mode])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.RATE_CONTROL_TICK_SECONDS)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Erro ao ajustar a taxa de telemetria")
@@ -0,0 +1,83 @@
+DELTA_TYPES = ("pc_info_descriptor", "pc_info", "pc_info_delta")
+
+
+class TelemetryStream:
+    """Remonta o pc_info completo de um agent a partir do protocolo delta.
+
+    pc_info_descriptor  campos estáticos, uma vez por sessão
+    pc_info             keyframe completo (também o formato antigo)
+    pc_info_delta       só os campos numéricos que mudaram
+    """
+
+    def __init__(self):
+        self.static = {}
+        self.snapshot = None
+
+    def apply(self, data):
+        msg_type = data.get("type")
+
+        if msg_type == "pc_info_descriptor":
+            self.static = {k: v for k, v in data.items() if k != "type"}
+            if self.snapshot is not None:
+                self.snapshot.update(self.static)
+            return None
+
+        if msg_type == "pc_info":
+            self.snapshot = {**self.static, **data}
+            return dict(self.snapshot)
+
+        if msg_type == "pc_info_delta":
+            # Delta sem keyframe anterior é descartado até o próximo keyframe
+            if self.snapshot is None:
+                return None
+            self.snapshot.update(data.get("changes", {}))
+            self.snapshot["timestamp"] = data.get("timestamp")
+            boot_time = self.snapshot.get("boot_time")
+            if boot_time is not None and self.snapshot["timestamp"] is not None:
+                self.snapshot["uptime"] = self.snapshot["timestamp"] - boot_time
+            return dict(self.snapshot)
+
+        return None
+
+
+PROCESS_TYPES = ("processes", "processes_delta")
+
+# O agent manda rss em KiB
+RSS_UNIT = 1024
+
+
+class ProcessStream:
+    """Remonta o top de processos de um agent a partir do stream de diffs.
+
+    processes        lista completa: {pid: [name, cpu_percent, rss_kib]}
+    processes_delta  linhas que mudaram (changes) e PIDs que saíram (removed)
+    """
+
+    def __init__(self):
+        self.rows = None
+
+    def apply(self, data):
+        msg_type = data.get("type")
+
+        if msg_type == "processes":
+            self.rows = dict(data.get("rows") or {})
+        elif msg_type == "processes_delta":
+            # Delta sem lista completa anterior é descartado
+            if self.rows is None:
+                return None
+            self.rows.update(data.get("changes") or {})
+            for pid in data.get("removed") or ():
+                self.rows.pop(pid, None)
+        else:
+            return None
+
+        processes = [
+            {"pid": int(pid), "name": name, "cpu_percent": cpu, "rss": rss * RSS_UNIT}
+            for pid, (name, cpu, rss) in self.rows.items()
+        ]
+        processes.sort(key=lambda process: process["cpu_percent"], reverse=True)
+        return {
+            "type": "processes",
+            "timestamp": data.get("timestamp"),
+            "processes": processes
+        }
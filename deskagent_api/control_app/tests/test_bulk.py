@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app import ratelimit, state
+
+from .utils import connect, receive_type
+
+
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory", RATE_LIMITS={})
+class BulkCommandTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        ratelimit._limiter = None
+        self.addCleanup(setattr, state, "_store", None)
+        self.addCleanup(setattr, ratelimit, "_limiter", None)
+
+    async def test_invalid_filters_and_timeout_are_rejected(self):
+        agent = await connect("/ws/control/", {
+            "type": "hello", "role": "agent",
+            "token": settings.AGENT_TOKEN, "agent_id": "agent-1", "tags": ["lab1"]
+        })
+        app = await connect("/ws/control/", {"type": "hello", "role": "app"})
+        await receive_type(app, "state_replay")
+
+        for bad in (
+            {"tags": [{"x": 1}]},
+            {"tags": ["lab1"], "timeout": "nan"},
+            {"agent_ids": ["agent-1"], "timeout": "inf"},
+        ):
+            await app.send_json_to({"type": "bulk_command", "action": "ping", **bad})
+            error = await receive_type(app, "feedback")
+            self.assertEqual(error["status"], "error", bad)
+
+        # A conexão continua de pé e o bulk válido termina
+        await app.send_json_to({"type": "bulk_command", "action": "ping", "tags": ["lab1"], "timeout": 1})
+        command = await receive_type(agent, "command")
+        await agent.send_json_to({
+            "type": "feedback", "status": "success",
+            "request_id": command["request_id"], "action": "ping"
+        })
+        result = await receive_type(app, "bulk_result", timeout=3)
+        self.assertTrue(result["final"])
+        self.assertEqual(result["done"], 1)
+
+        await app.disconnect()
+        await agent.disconnect()
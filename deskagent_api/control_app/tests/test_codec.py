@@ -0,0 +1,50 @@
+import json
+import time
+from unittest import skipUnless
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app import codec, state
+
+from .utils import connect, receive_type
+
+
+class BroadcastEventTests(SimpleTestCase):
+    def test_msgpack_is_built_on_demand(self):
+        event = codec.broadcast_event({"type": "pc_info", "agent_id": "agent-1", "cpu_percent": 1})
+        self.assertNotIn("bytes", event)
+        self.assertEqual(json.loads(event["text"])["cpu_percent"], 1)
+
+
+@skipUnless(codec.msgpack, "precisa de msgpack")
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory")
+class MsgpackFanoutTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+
+    async def test_json_and_msgpack_apps_get_the_same_pc_info(self):
+        json_app = await connect("/ws/pc_info/", {"type": "hello", "role": "app"})
+        msgpack_app = await connect("/ws/pc_info/", {"type": "hello", "role": "app", "protocols": ["msgpack"]})
+        await receive_type(json_app, "state_replay")
+        self.assertEqual((await msgpack_app.receive_json_from())["type"], "hello_ack")
+        await msgpack_app.receive_from()  # state_replay, já em msgpack
+
+        agent = await connect("/ws/pc_info/", {
+            "type": "hello", "role": "agent", "token": settings.AGENT_TOKEN, "agent_id": "agent-1"
+        })
+        await agent.send_json_to({
+            "type": "pc_info", "cpu_percent": 42, "memory": 1, "disk_usage": 1, "timestamp": time.time()
+        })
+
+        as_json = await receive_type(json_app, "pc_info")
+        while True:
+            as_msgpack = codec.unpack(await msgpack_app.receive_from())
+            if as_msgpack.get("type") == "pc_info":
+                break
+        self.assertEqual(as_msgpack, as_json)
+        self.assertEqual(as_msgpack["cpu_percent"], 42)
+
+        for communicator in (json_app, msgpack_app, agent):
+            await communicator.disconnect()
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app import state
+from control_app.registry import registry, telemetry_registry
+
+from .utils import connect, receive_type
+
+
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory")
+class AgentTokenTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+
+    async def test_pc_info_agent_needs_token(self):
+        for hello in (
+            {"type": "hello", "role": "agent", "agent_id": "intruder"},
+            {"type": "hello", "role": "agent", "agent_id": "intruder", "token": "errado"},
+        ):
+            agent = await connect("/ws/pc_info/", hello)
+            error = await receive_type(agent, "feedback")
+            self.assertEqual(error["message"], "Token inválido")
+            self.assertEqual((await agent.receive_output(1))["type"], "websocket.close")
+            self.assertIsNone(await telemetry_registry.get_channel("intruder"))
+
+    async def test_connection_stats_are_kept_in_registry(self):
+        agent = await connect("/ws/control/", {
+            "type": "hello", "role": "agent", "token": settings.AGENT_TOKEN, "agent_id": "agent-1",
+            "connection": {"connects": 3, "failures": 2, "last_delay": 1.5, "uptime": 0.0,
+                           "last_error": "ConnectionRefusedError()", "extra": "x" * 10000}
+        })
+        await agent.send_json_to({"type": "heartbeat", "role": "agent"})
+        await agent.receive_nothing(0.1)
+
+        meta = await registry.get_meta("agent-1")
+        self.assertEqual(meta["connection"], {
+            "connects": 3, "failures": 2, "last_delay": 1.5, "uptime": 0.0,
+            "last_error": "ConnectionRefusedError()"
+        })
+        await agent.disconnect()
+
+    async def test_bad_message_type_does_not_close_socket(self):
+        for path in ("/ws/control/", "/ws/pc_info/"):
+            client = await connect(path, {"type": [1]})
+            await client.send_json_to({"type": {"x": 1}, "role": "app"})
+            await client.send_json_to({"type": "hello", "role": "app"})
+            replay = await receive_type(client, "state_replay")
+            self.assertEqual(replay["type"], "state_replay")
+            await client.disconnect()
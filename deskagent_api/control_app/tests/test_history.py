@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app.history import HistoryStore
+
+from .utils import connect, receive_type
+
+
+@override_settings(AUDIT_ENABLED=False)
+class HistoryQueryTests(SimpleTestCase):
+    async def test_invalid_query_does_not_drop_agent(self):
+        agent = await connect("/ws/pc_info/", {
+            "type": "hello", "role": "agent",
+            "token": settings.AGENT_TOKEN, "agent_id": "history-agent"
+        })
+        now = time.time()
+        await agent.send_json_to({
+            "type": "pc_info", "cpu_percent": 10, "memory": 1, "disk_usage": 1,
+            "timestamp": now
+        })
+        app = await connect("/ws/pc_info/", {"type": "hello", "role": "app"})
+        await receive_type(app, "state_replay")
+
+        for bad in ({"since": "x"}, {"until": "nan"}, {"resolution": "inf"}, {"since": 10, "until": 5}):
+            await app.send_json_to({"type": "history", "agent_id": "history-agent", **bad})
+            error = await receive_type(app, "feedback")
+            self.assertEqual(error["status"], "error")
+
+        # A conexão do agent continua atendendo consultas válidas
+        await app.send_json_to({"type": "history", "agent_id": "history-agent", "since": 0})
+        result = await receive_type(app, "history")
+        self.assertEqual(result["agent_id"], "history-agent")
+        # Janela longa: tier de 1h, cujo único ponto é o intervalo ainda aberto
+        self.assertEqual(result["resolution"], 3600)
+        self.assertEqual(result["points"]["timestamp"], [int(now) // 3600 * 3600])
+        self.assertEqual(result["points"]["cpu_percent"], [10])
+
+        await app.disconnect()
+        await agent.disconnect()
+
+
+class HistoryStoreTests(SimpleTestCase):
+    def record(self, store, timestamp, cpu):
+        store.record("agent-1", {"cpu_percent": cpu, "memory": 1, "disk_usage": 1, "timestamp": timestamp})
+
+    def test_coarse_tier_includes_open_interval(self):
+        store = HistoryStore(tiers=[(1, 10), (60, 10)], max_agents=10)
+        for second, cpu in ((0, 10), (30, 20), (60, 30), (90, 50)):
+            self.record(store, 6000 + second, cpu)
+
+        result = store.query("agent-1", since=5000, until=6100, resolution=60)
+        self.assertEqual(result["resolution"], 60)
+        # 6000 já fechou; 6060 ainda está aberto e entra com a média parcial
+        self.assertEqual(result["points"]["timestamp"], [6000, 6060])
+        self.assertEqual(result["points"]["cpu_percent"], [15, 40])
+
+        # Fora da janela pedida, o intervalo aberto não aparece
+        result = store.query("agent-1", since=5000, until=6030, resolution=60)
+        self.assertEqual(result["points"]["timestamp"], [6000])
+
+    def test_raw_tier(self):
+        store = HistoryStore(tiers=[(1, 10), (60, 10)], max_agents=10)
+        for second in range(5):
+            self.record(store, 6000 + second, second)
+
+        result = store.query("agent-1", since=6001, until=6003)
+        self.assertEqual(result["resolution"], 1)
+        self.assertEqual(result["points"]["timestamp"], [6001, 6002, 6003])
+        self.assertEqual(result["points"]["cpu_percent"], [1, 2, 3])
@@ -0,0 +1,103 @@
+import asyncio
+
+from django.test import SimpleTestCase, override_settings
+
+from control_app import state
+from control_app.outbox import LATEST, Outbox
+
+from .utils import connect
+
+
+class OutboxTests(SimpleTestCase):
+    async def test_client_without_acks_is_disconnected(self):
+        # Como o Daphne: send() volta na hora, sem esperar o socket
+        frames = []
+        slow = asyncio.Event()
+
+        async def sender(frame):
+            frames.append(frame)
+
+        async def on_slow():
+            slow.set()
+
+        outbox = Outbox(sender, on_slow, max_depth=10,
+                        policies={"pc_info": LATEST}, slow_timeout=0.2)
+        outbox.use_acks(5)
+        outbox.start()
+        try:
+            # O cliente para de confirmar: só a janela sai, o resto fica na fila
+            for i in range(60):
+                outbox.put("pc_info", f"{i}", key=f"agent-{i}")
+                outbox.put("log", f"{i}")
+                await asyncio.sleep(0.01)
+            self.assertEqual(len(frames), 5)
+            self.assertLessEqual(len(outbox), 10)
+            self.assertGreater(outbox.dropped, 0)
+            self.assertTrue(slow.is_set())
+        finally:
+            await outbox.close()
+
+    async def test_acking_client_keeps_up(self):
+        frames = []
+        slow = asyncio.Event()
+        outbox = None
+
+        async def sender(frame):
+            frames.append(frame)
+            # O cliente confirma logo depois de receber
+            asyncio.get_running_loop().call_soon(outbox.ack, len(frames))
+
+        async def on_slow():
+            slow.set()
+
+        outbox = Outbox(sender, on_slow, max_depth=10, slow_timeout=0.2)
+        outbox.use_acks(5)
+        outbox.start()
+        try:
+            for i in range(60):
+                outbox.put("log", f"{i}")
+                await asyncio.sleep(0.005)
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(frames), 60)
+            self.assertEqual(outbox.dropped, 0)
+            self.assertFalse(slow.is_set())
+        finally:
+            await outbox.close()
+
+    async def test_drained_queue_resets_slow_clock(self):
+        slow = asyncio.Event()
+
+        async def sender(frame):
+            await asyncio.sleep(0)
+
+        async def on_slow():
+            slow.set()
+
+        outbox = Outbox(sender, on_slow, max_depth=10, slow_timeout=0.2)
+        outbox.start()
+        try:
+            # Rajadas que enchem a fila, mas ela esvazia entre elas
+            for _ in range(6):
+                for i in range(20):
+                    outbox.put("log", f"{i}")
+                await asyncio.sleep(0.05)
+            self.assertFalse(slow.is_set())
+        finally:
+            await outbox.close()
+
+
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory")
+class AckWindowTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+
+    async def test_hello_ack_window(self):
+        app = await connect("/ws/control/", {"type": "hello", "role": "app", "ack_window": 1})
+        self.assertEqual((await app.receive_json_from())["type"], "presence")
+        # O state_replay espera o ack do primeiro quadro
+        self.assertTrue(await app.receive_nothing(0.1))
+
+        await app.send_json_to({"type": "ack", "received": 1})
+        self.assertEqual((await app.receive_json_from())["type"], "state_replay")
+        await app.disconnect()
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from control_app import state
+from control_app.presence import PRESENCE_KEY, PresenceTable
+from control_app.statecache import StateCache
+
+
+@override_settings(STATE_BACKEND="memory")
+class PresenceTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+
+    async def drain(self, layer, channel):
+        messages = []
+        while True:
+            try:
+                event = await asyncio.wait_for(layer.receive(channel), 0.1)
+            except asyncio.TimeoutError:
+                return messages
+            messages.append(json.loads(event["text"]))
+
+    async def test_agents_of_crashed_worker_expire(self):
+        store = state.get_store()
+        now = time.time()
+        await store.hset_many(PRESENCE_KEY, {
+            # Worker que caiu: ninguém mais regrava
+            "agent-old": {"online": True, "last_seen": now - 60, "updated_at": now - 60},
+            "agent-live": {"online": True, "last_seen": now, "updated_at": now}
+        })
+
+        self.assertEqual(list(await PresenceTable("apps").snapshot()), ["agent-live"])
+        replay = await StateCache().replay(["snapshot"])
+        self.assertEqual(list(replay["agents"]), ["agent-live"])
+        self.assertEqual(await store.hkeys(PRESENCE_KEY), ["agent-live"])
+
+    async def test_offline_status_only_when_fleet_is_offline(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add("apps-presence", channel)
+        table = PresenceTable("apps-presence")
+        store = state.get_store()
+
+        # Outro worker ainda tem um agent online
+        await store.hset(PRESENCE_KEY, "agent-2", {"online": True, "last_seen": time.time(), "updated_at": time.time()})
+        table.connected("agent-1", "chan-1")
+        await table.flush()
+        table.disconnected("agent-1", "chan-1")
+        await table.flush()
+        statuses = [m["online"] for m in await self.drain(layer, channel) if m["type"] == "status"]
+        self.assertNotIn(False, statuses)
+
+        await store.hdel(PRESENCE_KEY, "agent-2")
+        table.connected("agent-1", "chan-1")
+        await table.flush()
+        table.disconnected("agent-1", "chan-1")
+        await table.flush()
+        statuses = [m["online"] for m in await self.drain(layer, channel) if m["type"] == "status"]
+        self.assertEqual(statuses[-1], False)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app import ratelimit, state
+
+from .utils import connect, receive_type
+
+
+LIMITS = {"app": {"rate": 0.001, "burst": 1}}
+
+
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory", RATE_LIMITS=LIMITS)
+class AppRateLimitTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        ratelimit._limiter = None
+        self.addCleanup(setattr, state, "_store", None)
+        self.addCleanup(setattr, ratelimit, "_limiter", None)
+
+    async def command(self, app, request_id):
+        await app.send_json_to({
+            "type": "command", "action": "ping", "agent_id": "agent-1", "request_id": request_id
+        })
+
+    async def test_limit_is_per_connection(self):
+        agent = await connect("/ws/control/", {
+            "type": "hello", "role": "agent", "token": settings.AGENT_TOKEN, "agent_id": "agent-1"
+        })
+        # Mesmo user_id e mesmo IP (atrás de NAT): um não limita o outro
+        first = await connect("/ws/control/", {"type": "hello", "role": "app", "user_id": "ana"})
+        second = await connect("/ws/control/", {"type": "hello", "role": "app", "user_id": "ana"})
+
+        await self.command(first, "a1")
+        self.assertEqual((await receive_type(agent, "command"))["request_id"], "a1")
+        await self.command(second, "b1")
+        self.assertEqual((await receive_type(agent, "command"))["request_id"], "b1")
+
+        # A mesma conexão esgota o próprio bucket
+        await self.command(first, "a2")
+        error = await receive_type(first, "feedback")
+        self.assertEqual((error["status"], error["request_id"]), ("error", "a2"))
+
+        for communicator in (first, second, agent):
+            await communicator.disconnect()
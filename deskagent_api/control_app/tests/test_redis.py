@@ -0,0 +1,144 @@
+import asyncio
+from unittest import mock, skipUnless
+
+import redis.asyncio as aioredis
+from django.test import SimpleTestCase
+
+from control_app.layers import ShardedRedisChannelLayer
+from control_app.ratelimit import RateLimiter, RedisBuckets
+from control_app.state import RedisStore
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (scripts Lua no fakeredis)
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "precisa de fakeredis[lua] (requirements-dev.txt)")
+class RedisStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+
+    def worker_store(self):
+        # Cada worker tem seu próprio cliente; o servidor é o mesmo
+        return RedisStore(client=fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True))
+
+    async def test_state_is_shared_between_workers(self):
+        first, second = self.worker_store(), self.worker_store()
+
+        await first.hset("registry", "agent-1", {"channel": "a"})
+        await first.hset_many("registry", {"agent-2": {"channel": "b"}})
+        self.assertEqual(await second.hget("registry", "agent-1"), {"channel": "a"})
+        self.assertEqual(sorted(await second.hkeys("registry")), ["agent-1", "agent-2"])
+
+        await second.hdel("registry", "agent-2")
+        self.assertEqual(await first.hgetall("registry"), {"agent-1": {"channel": "a"}})
+
+    async def test_hdel_if_only_removes_expected_value(self):
+        first, second = self.worker_store(), self.worker_store()
+        await first.hset("registry", "agent-1", {"channel": "new"})
+
+        # O worker antigo não apaga o registro da reconexão mais nova
+        self.assertFalse(await second.hdel_if("registry", "agent-1", {"channel": "old"}))
+        self.assertTrue(await second.hdel_if("registry", "agent-1", {"channel": "new"}))
+        self.assertIsNone(await first.hget("registry", "agent-1"))
+
+    async def test_hset_if_is_compare_and_set(self):
+        first, second = self.worker_store(), self.worker_store()
+
+        # Dois workers disputam a mesma claim: só um leva
+        self.assertTrue(await first.hset_if("claims", "job-1", None, {"worker": "a"}))
+        self.assertFalse(await second.hset_if("claims", "job-1", None, {"worker": "b"}))
+        self.assertTrue(await second.hset_if("claims", "job-1", {"worker": "a"}, {"worker": "b"}))
+        self.assertEqual(await first.hget("claims", "job-1"), {"worker": "b"})
+
+    async def test_expire(self):
+        store = self.worker_store()
+        await store.hset("presence", "agent-1", {"online": True})
+        await store.expire("presence", 30)
+        self.assertGreater(await store.client.ttl("deskagent:presence"), 0)
+
+
+@skipUnless(fakeredis, "precisa de fakeredis[lua] (requirements-dev.txt)")
+class RedisBucketsTests(SimpleTestCase):
+    async def test_bucket_is_shared_between_workers(self):
+        server = fakeredis.FakeServer()
+        rules = {"app": {"rate": 0.001, "burst": 2}}
+        workers = [
+            RateLimiter(rules, RedisBuckets(fakeredis.FakeAsyncRedis(server=server), ttl=60))
+            for _ in range(2)
+        ]
+
+        allowed = [await workers[i % 2].allow("app", "user-1") for i in range(4)]
+        self.assertEqual(allowed, [True, True, False, False])
+        # Outro usuário tem o próprio bucket
+        self.assertTrue(await workers[1].allow("app", "user-2"))
+        self.assertTrue(await workers[0].allow("agent_action", "sem regra"))
+
+    async def test_bucket_refills(self):
+        limiter = RateLimiter(
+            {"app": {"rate": 20, "burst": 1}},
+            RedisBuckets(fakeredis.FakeAsyncRedis(), ttl=60)
+        )
+        self.assertTrue(await limiter.allow("app", "user-1"))
+        self.assertFalse(await limiter.allow("app", "user-1"))
+        await asyncio.sleep(0.1)
+        self.assertTrue(await limiter.allow("app", "user-1"))
+
+
+@skipUnless(fakeredis, "precisa de fakeredis[lua] (requirements-dev.txt)")
+class ShardedLayerTests(SimpleTestCase):
+    """CHANNEL_LAYER=redis_sharded: canais e grupos espalhados por REDIS_URLS."""
+
+    HOSTS = ["redis://shard-0:6379/0", "redis://shard-1:6379/0"]
+
+    def setUp(self):
+        servers = [fakeredis.FakeServer() for _ in self.HOSTS]
+
+        def create_pool(layer, index):
+            return aioredis.ConnectionPool(
+                connection_class=fakeredis.FakeAsyncConnection,
+                server=servers[index]
+            )
+
+        patcher = mock.patch.object(ShardedRedisChannelLayer, "create_pool", create_pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def worker_layer(self):
+        return ShardedRedisChannelLayer(hosts=self.HOSTS, expiry=30)
+
+    async def test_group_send_crosses_workers_and_shards(self):
+        # Um canal por worker: os prefixos caem nos dois shards
+        members = [self.worker_layer() for _ in range(16)]
+        sender = self.worker_layer()
+        channels = [await layer.new_channel() for layer in members]
+        for layer, channel in zip(members, channels):
+            await layer.group_add("apps", channel)
+        self.assertEqual(len({sender.consistent_hash(channel) for channel in channels}), 2)
+
+        await sender.group_send("apps", {"type": "broadcast_message", "text": "oi"})
+        for layer, channel in zip(members, channels):
+            message = await asyncio.wait_for(layer.receive(channel), 5)
+            self.assertEqual(message["text"], "oi")
+
+        for layer in members:
+            await layer.close_pools()
+        await sender.close_pools()
+
+    async def test_send_to_channel_of_other_worker(self):
+        # Vários workers do lado que recebe: os prefixos caem nos dois shards
+        receivers = [self.worker_layer() for _ in range(16)]
+        sender = self.worker_layer()
+        self.assertEqual(len({layer.consistent_hash(await layer.new_channel()) for layer in receivers}), 2)
+
+        for i, layer in enumerate(receivers):
+            channel = await layer.new_channel()
+            await sender.send(channel, {"type": "deliver_command", "message": {"n": i}})
+            message = await asyncio.wait_for(layer.receive(channel), 5)
+            self.assertEqual(message["message"], {"n": i})
+
+        for layer in receivers:
+            await layer.close_pools()
+        await sender.close_pools()
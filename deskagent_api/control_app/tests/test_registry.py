@@ -0,0 +1,47 @@
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from control_app import state
+from control_app.presence import PRESENCE_KEY
+from control_app.registry import AgentRegistry
+
+
+@override_settings(STATE_BACKEND="memory", PRESENCE_TIMEOUT_SECONDS=15, PRESENCE_KEEPALIVE_SECONDS=5)
+class AgentRegistryTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+        self.registry = AgentRegistry("agents")
+
+    async def register_old(self, agent_id, channel_name, tags=()):
+        # Registro antigo: só vale se a presença do agent ainda é regravada
+        await self.registry.register(agent_id, channel_name, tags=list(tags))
+        store = state.get_store()
+        meta = await store.hget(self.registry.meta_key, agent_id)
+        await store.hset(self.registry.meta_key, agent_id, {**meta, "connected_at": time.time() - 600})
+
+    async def test_new_registration_is_live_before_presence_tick(self):
+        await self.registry.register("agent-1", "chan-1", tags=["lab1"])
+        self.assertEqual(await self.registry.get_channel("agent-1"), "chan-1")
+        self.assertEqual(await self.registry.find_by_tags(["lab1"]), ["agent-1"])
+
+    async def test_agents_of_crashed_worker_are_dropped(self):
+        store = state.get_store()
+        await self.register_old("agent-live", "chan-live", tags=["lab1"])
+        await self.register_old("agent-dead", "chan-dead", tags=["lab1"])
+        await store.hset(PRESENCE_KEY, "agent-live", {"online": True, "updated_at": time.time()})
+        # Worker que caiu: a presença parou de ser regravada
+        await store.hset(PRESENCE_KEY, "agent-dead", {"online": True, "updated_at": time.time() - 60})
+
+        self.assertEqual(await self.registry.find_by_tags(["lab1"]), ["agent-live"])
+        self.assertEqual(await self.registry.agent_ids(), ["agent-live"])
+        self.assertIsNone(await self.registry.get_channel("agent-dead"))
+        self.assertEqual(await self.registry.get_channel("agent-live"), "chan-live")
+        self.assertEqual(await store.hkeys(self.registry.key), ["agent-live"])
+        self.assertEqual(await store.hkeys(self.registry.meta_key), ["agent-live"])
+
+    async def test_get_channel_drops_stale_entry(self):
+        await self.register_old("agent-1", "chan-1")
+        self.assertIsNone(await self.registry.get_channel("agent-1"))
+        self.assertIsNone(await self.registry.get_meta("agent-1"))
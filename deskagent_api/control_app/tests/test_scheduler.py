@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from control_app import ratelimit, state
+from control_app.registry import registry
+from control_app.scheduler import CLAIMS_KEY, SCHEDULES_KEY, Scheduler
+
+from .utils import connect, receive_type
+
+
+COMMAND = {"action": "ping", "agent_id": "agent-1"}
+
+
+@override_settings(AUDIT_ENABLED=False, STATE_BACKEND="memory", RATE_LIMITS={})
+class SchedulerTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        ratelimit._limiter = None
+        self.addCleanup(setattr, state, "_store", None)
+        self.addCleanup(setattr, ratelimit, "_limiter", None)
+
+    def test_rejects_non_finite_times(self):
+        scheduler = Scheduler("apps")
+        for data in (
+            {"at": "nan"},
+            {"at": "inf"},
+            {"delay": "nan"},
+            {"delay": 1, "interval": "nan"},
+            {"delay": 1, "interval": "inf"},
+            {"delay": 1, "interval": 0},
+            {"delay": 1, "interval": -30},
+            {"delay": 1, "command": {"action": "ping", "agent_ids": "agent-1"}},
+            {"delay": 1, "command": {"action": "ping", "agent_ids": [["agent-1"]]}},
+        ):
+            job, error = scheduler.build_job({"command": COMMAND, **data}, owner="app")
+            self.assertIsNone(job, data)
+            self.assertTrue(error)
+
+    async def test_nan_job_does_not_block_later_jobs(self):
+        agent = await connect("/ws/control/", {
+            "type": "hello", "role": "agent",
+            "token": settings.AGENT_TOKEN, "agent_id": "agent-1"
+        })
+        app = await connect("/ws/control/", {"type": "hello", "role": "app"})
+        await receive_type(app, "state_replay")
+
+        await app.send_json_to({"type": "schedule_command", "command": COMMAND, "at": "nan"})
+        error = await receive_type(app, "feedback")
+        self.assertEqual(error["status"], "error")
+
+        await app.send_json_to({"type": "schedule_command", "command": COMMAND, "delay": 0.2})
+        created = await receive_type(app, "schedule")
+        command = await receive_type(agent, "command", timeout=2)
+        self.assertEqual(command["job_id"], created["job"]["job_id"])
+
+        await app.disconnect()
+        await agent.disconnect()
+
+    async def test_stored_jobs_fire_after_restart_on_one_worker(self):
+        layer = get_channel_layer()
+        agent_channel = await layer.new_channel()
+        await registry.register("agent-1", agent_channel)
+
+        # Job gravado pelo processo anterior, cuja claim venceu
+        before = Scheduler("apps")
+        job, _ = before.build_job({"command": COMMAND, "delay": 0}, owner="app")
+        await before.add(job)
+        store = state.get_store()
+        claim = await store.hget(CLAIMS_KEY, job["job_id"])
+        await store.hset(CLAIMS_KEY, job["job_id"], {**claim, "until": time.time() - 1})
+
+        first, second = Scheduler("apps"), Scheduler("apps")
+        await first.sync()
+        await second.sync()
+        self.assertEqual((len(first), len(second)), (1, 0))
+
+        await second.fire_due()
+        await first.fire_due()
+        message = await asyncio.wait_for(layer.receive(agent_channel), 1)
+        self.assertEqual(message["message"]["job_id"], job["job_id"])
+        # Disparado uma vez só, e job e claim saem do store
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(agent_channel), 0.1)
+        self.assertEqual(await store.hkeys(SCHEDULES_KEY), [])
+        self.assertEqual(await store.hkeys(CLAIMS_KEY), [])
+
+    async def test_owner_keeps_claim_while_renewing(self):
+        owner, other = Scheduler("apps"), Scheduler("apps")
+        job, _ = owner.build_job({"command": COMMAND, "delay": 60}, owner="app")
+        await owner.add(job)
+
+        now = time.time()
+        for later in (20, 40, 60):
+            await owner.sync(now + later)
+            await other.sync(now + later)
+        self.assertEqual((len(owner), len(other)), (1, 0))
+
+        # O dono para de renovar: outro worker assume depois do prazo
+        await other.sync(now + 100)
+        self.assertEqual(len(other), 1)
+        await owner.sync(now + 101)
+        self.assertEqual(len(owner), 0)
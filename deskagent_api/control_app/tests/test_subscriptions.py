@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, override_settings
+
+from control_app import state
+from control_app.subscriptions import IDLE, SUBSCRIPTIONS_KEY, RateController
+
+
+@override_settings(STATE_BACKEND="memory", SUBSCRIPTION_REFRESH_SECONDS=10)
+class RateControllerTests(SimpleTestCase):
+    def setUp(self):
+        state._store = None
+        self.addCleanup(setattr, state, "_store", None)
+
+    async def test_subscriptions_of_crashed_worker_expire(self):
+        layer = get_channel_layer()
+        agent_channel = await layer.new_channel()
+        controller = RateController()
+        controller.agent_connected("agent-1", agent_channel)
+
+        # App de um worker que caiu: a inscrição nunca mais é regravada
+        store = state.get_store()
+        await store.hset(SUBSCRIPTIONS_KEY, "dead-app", {
+            "agents": None, "focus": None, "timestamp": time.time() - 60
+        })
+        await controller.tick()
+
+        message = await asyncio.wait_for(layer.receive(agent_channel), 1)
+        self.assertEqual(message["message"]["mode"], IDLE)
+        self.assertEqual(await store.hkeys(SUBSCRIPTIONS_KEY), [])
+
+    async def test_own_subscriptions_are_refreshed(self):
+        controller = RateController()
+        await controller.subscribe("app-1")
+        store = state.get_store()
+        entry = await store.hget(SUBSCRIPTIONS_KEY, "app-1")
+
+        # Passado o intervalo, o worker regrava com timestamp novo
+        await controller.refresh(entry["timestamp"] + 11)
+        refreshed = await store.hget(SUBSCRIPTIONS_KEY, "app-1")
+        self.assertEqual(refreshed["timestamp"], entry["timestamp"] + 11)
+        # Ainda válida bem depois do primeiro timestamp
+        self.assertEqual(len(await controller.load_subscriptions(entry["timestamp"] + 35)), 1)
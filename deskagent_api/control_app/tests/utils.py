@@ -0,0 +1,21 @@
+import json
+
+from channels.testing import WebsocketCommunicator
+
+from deskagent_api.asgi import application
+
+
+async def connect(path, hello):
+    communicator = WebsocketCommunicator(application, path)
+    connected, _ = await communicator.connect()
+    assert connected
+    await communicator.send_to(text_data=json.dumps(hello))
+    return communicator
+
+
+async def receive_type(communicator, msg_type, timeout=1):
+    """Próxima mensagem do tipo pedido, descartando as outras."""
+    while True:
+        message = await communicator.receive_json_from(timeout)
+        if message.get("type") == msg_type:
+            return message
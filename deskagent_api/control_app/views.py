@@ -1,3 +1,14 @@
-from django.shortcuts import render
+from django.http import HttpResponse
 
-# Create your views here.
+from .metrics import register_collector, render
+from .outbox import outbox_stats
+
+
+register_collector(lambda: {
+    f"deskagent_outbox_{name}": value for name, value in outbox_stats().items()
+})
+
+
+async def metrics(request):
+    # View async: roda no mesmo event loop dos consumers, sem concorrência
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
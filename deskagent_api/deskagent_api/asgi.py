@@ -10,14 +10,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from control_app import routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'deskagent_api.settings')
+# Initialize Django before importing consumers, which read settings at import time.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from control_app import routing
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": django_asgi_app,
         "websocket": URLRouter(
             routing.websocket_urlpatterns
         ),
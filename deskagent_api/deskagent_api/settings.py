@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 AGENT_TOKEN=config("AGENT_TOKEN")
 # DESKAGENT_SECRET = config("DESKAGENT_SECRET")
@@ -89,6 +89,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets the audit writer append while readers query.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'timeout': 20,
+        },
     }
 }
 
@@ -136,19 +141,181 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 
-# REDIS_URL=config("REDIS_URL")
-# CHANNEL_LAYERS = {
-#     "default": {
-#         "BACKEND": "channels_redis.core.RedisChannelLayer",
-#         "CONFIG": {
-#             "hosts": [REDIS_URL],
-#         },
-#     },
-# }
+# Channel layer
+# https://channels.readthedocs.io/en/latest/topics/channel_layers.html
+#   memory         single process only (development)
+#   redis          one Redis server shared by every Daphne worker
+#   redis_sharded  channels and groups sharded across all REDIS_URLS
+CHANNEL_LAYER = config("CHANNEL_LAYER", default="memory")
+REDIS_URLS = config("REDIS_URLS", default="redis://localhost:6379/0", cast=Csv())
+
+if CHANNEL_LAYER == "memory":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            # Same as channels_redis.core.RedisChannelLayer, with sharding fixed
+            "BACKEND": "control_app.layers.ShardedRedisChannelLayer",
+            "CONFIG": {
+                "hosts": REDIS_URLS if CHANNEL_LAYER == "redis_sharded" else REDIS_URLS[:1],
+                "capacity": config("CHANNEL_CAPACITY", default=1500, cast=int),
+                "expiry": 30,
+            },
+        },
+    }
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# Shared state (agent registry, presence, rate limits).
+# "memory" is only correct with a single worker.
+STATE_BACKEND = config(
+    "STATE_BACKEND",
+    default="memory" if CHANNEL_LAYER == "memory" else "redis"
+)
+STATE_REDIS_URL = config("STATE_REDIS_URL", default=REDIS_URLS[0])
+
+# Command rate limits (token buckets).
+#   rate   tokens refilled per second
+#   burst  bucket size
+RATE_LIMITS = {
+    "app": {"rate": 0.5, "burst": 1},
+    "agent_action": {"rate": 0.5, "burst": 1},
+}
+# Only for load tests against real workers (loadtest --workers).
+if not config("RATE_LIMITS_ENABLED", default=True, cast=bool):
+    RATE_LIMITS = {}
+# Idle buckets are dropped after this long (must be >= burst / rate).
+RATE_LIMIT_TTL_SECONDS = 600
+# Upper bound for the in-memory backend.
+RATE_LIMIT_MAX_ENTRIES = 100_000
+
+# Presence: heartbeats are folded into one batched diff per tick.
+PRESENCE_TICK_SECONDS = 1
+# Short "status" message that keeps apps showing the fleet as online. Each
+# worker also rewrites its agents' presence this often; entries not rewritten
+# for PRESENCE_TIMEOUT_SECONDS + this (a crashed worker) are dropped on read.
+PRESENCE_KEEPALIVE_SECONDS = 5
+# Agents with no message for this long are marked offline and disconnected.
+# Should be a few heartbeat intervals; agents using "heartbeat": "ping"
+# rely on the server's WebSocket ping timeout instead (see serve.py).
+PRESENCE_TIMEOUT_SECONDS = config("PRESENCE_TIMEOUT_SECONDS", default=15, cast=int)
+
+# Telemetry history kept per agent, as (step seconds, points) per tier:
+# raw samples for 1 hour, 1 minute averages for 1 day, 1 hour averages
+# for 30 days. About 54 KB per agent.
+HISTORY_TIERS = [(3, 1200), (60, 1440), (3600, 720)]
+HISTORY_MAX_AGENTS = 20_000
+
+# Per-connection outbound queue.
+# Policies: "latest" keeps only the newest message per (type, agent),
+# "drop_oldest" evicts the oldest droppable message when full and
+# "never" is never dropped. Unlisted types use "drop_oldest".
+OUTBOX_MAX_DEPTH = 100
+OUTBOX_POLICIES = {
+    "pc_info": "latest",
+    "status": "latest",
+    "presence": "never",
+    "feedback": "never",
+    "command": "never",
+    "schedule": "never",
+    "schedules": "never",
+    "bulk_result": "never",
+    "audit": "never",
+    "state_replay": "never",
+    "rate_control": "latest",
+    "processes": "latest",
+}
+# Connections whose queue stays over OUTBOX_MAX_DEPTH this long are closed.
+OUTBOX_SLOW_TIMEOUT = 10
+# Daphne's send() never waits for the socket, so the queue only fills for
+# clients that acknowledge frames: a hello with "ack_window" (capped here)
+# plus {"type": "ack", "received": <frames processed>} messages.
+OUTBOX_MAX_ACK_WINDOW = 256
+
+# Scheduled commands (schedule_command). One heap and one timer task per
+# worker; jobs are lost if the worker that holds them restarts.
+SCHEDULER_MAX_JOBS = 50_000
+SCHEDULER_MIN_INTERVAL = 10
+# Each stored job is claimed by one worker for this long and renewed every
+# third of it; jobs of a worker that stops renewing (restart, crash) are
+# picked up by another worker or by the restarted one.
+SCHEDULER_CLAIM_SECONDS = 30
+
+# bulk_command: results are streamed to the requesting app every
+# BULK_FLUSH_INTERVAL seconds until every target answers or the
+# timeout (seconds, capped at BULK_MAX_TIMEOUT) runs out.
+BULK_MAX_TARGETS = 5_000
+BULK_DEFAULT_TIMEOUT = 30
+BULK_MAX_TIMEOUT = 300
+BULK_FLUSH_INTERVAL = 0.5
+# Pending bulk replies remembered per agent connection.
+BULK_MAX_ROUTES = 1_000
+
+# Audit trail of commands, final feedback and agent logs (AuditRecord).
+# Writes are queued and bulk-inserted by a background thread every
+# AUDIT_FLUSH_INTERVAL seconds or AUDIT_BATCH_SIZE records.
+AUDIT_ENABLED = config("AUDIT_ENABLED", default=True, cast=bool)
+AUDIT_LOGS = config("AUDIT_LOGS", default=True, cast=bool)
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 1.0
+AUDIT_MAX_QUEUE = 100_000
+AUDIT_QUERY_LIMIT = 1_000
+
+# Last known state (pc_info snapshot, recent feedback) replayed to apps
+# right after their hello. Changes reach the shared store once per
+# STATE_CACHE_FLUSH_SECONDS; disconnected agents are forgotten after
+# STATE_CACHE_TTL_SECONDS.
+STATE_CACHE_FEEDBACK = 20
+STATE_CACHE_MAX_AGENTS = 20_000
+STATE_CACHE_TTL_SECONDS = 3600
+STATE_CACHE_FLUSH_SECONDS = 2
+
+# Telemetry sample interval (seconds) sent to agents in rate_control:
+#   idle     no app is watching the agent (None = heartbeats only)
+#   normal   at least one app is watching
+#   focused  an app has the agent in focus
+TELEMETRY_RATES = {"idle": 60, "normal": 3, "focused": 1}
+RATE_CONTROL_TICK_SECONDS = 2
+# Each worker rewrites its apps' subscriptions this often; entries not
+# rewritten for 3x this long (a crashed worker) are dropped on read.
+SUBSCRIPTION_REFRESH_SECONDS = 10
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# Records are queued and written to stderr by a background thread, so the
+# event loop never blocks on output. Noisy INFO/DEBUG events are rate
+# limited per (logger, message); warnings and errors always pass.
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+LOG_FORMAT = config("LOG_FORMAT", default="text")  # "text" or "json"
+LOG_RATE = config("LOG_RATE", default=10, cast=float)
+LOG_BURST = config("LOG_BURST", default=50, cast=int)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "text": {"()": "control_app.log.TextFormatter"},
+        "json": {"()": "control_app.log.JsonFormatter"},
+    },
+    "filters": {
+        "rate_limit": {
+            "()": "control_app.log.RateLimitFilter",
+            "rate": LOG_RATE,
+            "burst": LOG_BURST,
+        },
+    },
+    "handlers": {
+        "background": {
+            "()": "control_app.log.BackgroundHandler",
+            "formatter": LOG_FORMAT,
+            "filters": ["rate_limit"],
+        },
+    },
+    "root": {"handlers": ["background"], "level": "WARNING"},
+    "loggers": {
+        "django": {"level": "INFO"},
+        "control_app": {"level": LOG_LEVEL},
     },
 }
-
@@ -0,0 +1,68 @@
+"""Sobe N workers do Daphne compartilhando o mesmo socket.
+
+Uso: python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Com mais de um worker é obrigatório um channel layer Redis
+(CHANNEL_LAYER=redis ou redis_sharded), senão grupos, registro de agents
+e presença ficam presos em cada processo.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+from decouple import config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=config("DAPHNE_WORKERS", default=1, cast=int))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    # Ping/pong do WebSocket: derruba conexões meio abertas sem heartbeat de aplicação
+    parser.add_argument("--ping-interval", type=int, default=config("DAPHNE_PING_INTERVAL", default=20, cast=int))
+    parser.add_argument("--ping-timeout", type=int, default=config("DAPHNE_PING_TIMEOUT", default=30, cast=int))
+    args = parser.parse_args()
+
+    if args.workers > 1 and config("CHANNEL_LAYER", default="memory") == "memory":
+        sys.exit("CHANNEL_LAYER=memory não suporta mais de um worker")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    fd = sock.fileno()
+
+    workers = [
+        subprocess.Popen(
+            [
+                "daphne",
+                "--fd", str(fd),
+                "--ping-interval", str(args.ping_interval),
+                "--ping-timeout", str(args.ping_timeout),
+                "deskagent_api.asgi:application",
+            ],
+            pass_fds=(fd,),
+        )
+        for _ in range(args.workers)
+    ]
+
+    def stop(sig, frame):
+        for proc in workers:
+            proc.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Se um worker cair, derruba todos e deixa o supervisor reiniciar
+    os.wait()
+    stop(None, None)
+    for proc in workers:
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()